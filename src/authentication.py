@@ -0,0 +1,204 @@
+import numpy as np
+from bitstring import Bits
+
+# Mersenne prime 2^31 - 1: a product of two residues fits in 62 bits,
+# so the polynomial can be evaluated with plain uint64 numpy arithmetic
+PRIME = (1 << 31) - 1
+_PRIME = np.uint64(PRIME)
+# bytes packed in each coefficient of the polynomial (24 bits < 31 bits)
+BLOCK_BYTES = 3
+# bytes used to store each hash value in a tag
+WORD_BYTES = 4
+
+class AuthenticationError(Exception):
+	"""Raised when a tag does not match the message it comes with"""
+	pass
+
+class KeyExhaustedError(Exception):
+	"""Raised when the key pool has not enough bits left"""
+	pass
+
+class KeyPool:
+	"""Pool of secret bits shared by Alice and Bob.
+
+	Bits are consumed in order, so two pools created from the same key
+	hand out the same bits as long as they are used in the same order.
+
+	Parameters
+	----------
+	key : bitstring.Bits
+	    pre-shared (or previously distilled) secret key
+
+	"""
+
+	def __init__(self, key):
+		self._key = Bits(key)
+		self._position = 0
+
+	def take(self, length):
+		"""Consumes `length` bits from the pool
+
+		Returns
+		-------
+		bits : bitstring.Bits
+
+		"""
+		if length > self.available():
+			raise KeyExhaustedError(f'{length} bits requested, {self.available()} available')
+		bits = self._key[self._position:self._position + length]
+		self._position += length
+		return bits
+
+	def available(self):
+		return len(self._key) - self._position
+
+	def consumed(self):
+		return self._position
+
+class Authenticator:
+	"""Wegman-Carter authentication of classical messages.
+
+	Each message is hashed with `hashes` independent polynomial hashes over GF(PRIME):
+	the message is split in 24 bits coefficients m_1 ... m_L (plus a final coefficient holding
+	the message length) and the hash is sum(m_i * k^(L-i)) mod PRIME, for a secret point k.
+	Each hash is epsilon-almost-universal with epsilon = L / PRIME, so a forgery succeeds with
+	probability at most (L / PRIME) ^ hashes.
+
+	The points k are drawn from the key pool once, while every tag is encrypted with fresh one-time-pad
+	bits from the pool, added to each hash modulo PRIME: the polynomial hash is almost-universal for
+	differences modulo PRIME (two distinct messages give the same difference for at most L points),
+	not for XOR, so the pad has to be combined with the same operation for the bound above to hold.
+
+	Parameters
+	----------
+	key_pool : KeyPool
+	         pool from which hash keys and one-time-pads are drawn
+	hashes : int
+	       number of independent hashes in each tag
+
+	Attributes
+	----------
+	authenticated_bytes : int
+	                    bytes of all the messages tagged or verified so far
+	consumed_bits : int
+	              bits taken from the key pool, hash keys included
+
+	"""
+
+	def __init__(self, key_pool, hashes=4):
+		self._key_pool = key_pool
+		self._hashes = hashes
+		self._points = [key_pool.take(31).uint % PRIME for i in range(hashes)]
+		self._powers = [np.ones(1, dtype=np.uint64) for i in range(hashes)]
+		self.authenticated_bytes = 0
+		self.consumed_bits = 31 * hashes
+
+	def tag(self, message):
+		"""Computes the tag of a message
+
+		Parameters
+		----------
+		message : bytes
+
+		Returns
+		-------
+		tag : bytes
+
+		"""
+		pads = self._pads()
+		words = [(value + pad) % PRIME for value, pad in zip(self._hashes_of(message), pads)]
+		return b''.join(word.to_bytes(WORD_BYTES, 'big') for word in words)
+
+	def verify(self, message, tag):
+		"""Checks the tag of a message, raising AuthenticationError if it does not match
+
+		Parameters
+		----------
+		message : bytes
+		tag : bytes
+
+		"""
+		pads = self._pads()
+		if len(tag) != WORD_BYTES * self._hashes:
+			raise AuthenticationError('message tag does not match')
+		words = [int.from_bytes(tag[WORD_BYTES * i:WORD_BYTES * (i + 1)], 'big') for i in range(self._hashes)]
+		# the pads are removed modulo PRIME, as they were added
+		if [(word - pad) % PRIME for word, pad in zip(words, pads)] != self._hashes_of(message):
+			raise AuthenticationError('message tag does not match')
+
+	@staticmethod
+	def required_bits(messages, hashes=4):
+		"""Key bits needed to authenticate `messages` messages, hash keys included
+
+		Returns
+		-------
+		bits : int
+
+		"""
+		return 31 * hashes * (messages + 1)
+
+	def key_bits_per_byte(self):
+		"""Key bits consumed for each authenticated byte"""
+		return self.consumed_bits / self.authenticated_bytes if self.authenticated_bytes else 0.0
+
+	def _pads(self):
+		# fresh one-time-pad of a tag, one value in GF(PRIME) per hash
+		# (31 bits reduced modulo PRIME: only 0 and PRIME collide)
+		pad = self._key_pool.take(31 * self._hashes)
+		self.consumed_bits += len(pad)
+		return [pad[31 * i:31 * (i + 1)].uint % PRIME for i in range(self._hashes)]
+
+	def _hashes_of(self, message):
+		self.authenticated_bytes += len(message)
+		coefficients = _coefficients(message)
+		return [self._hash(coefficients, i) for i in range(self._hashes)]
+
+	def _hash(self, coefficients, i):
+		powers = self._powers_of(i, len(coefficients))
+		# each product is reduced before summing: L values below 2^31 cannot overflow 64 bits
+		return int(np.sum(coefficients * powers[len(coefficients) - 1::-1] % _PRIME) % PRIME)
+
+	def _powers_of(self, i, length):
+		# k^0 ... k^(length-1) are cached, and extended by repeated doubling:
+		# the block [n, 2n) is the block [0, n) multiplied by k^n
+		powers = self._powers[i]
+		if len(powers) >= length:
+			return powers
+		filled = len(powers)
+		powers = np.concatenate((powers, np.empty(max(length, 2 * filled) - filled, dtype=np.uint64)))
+		while filled < len(powers):
+			step = pow(self._points[i], filled, PRIME)
+			count = min(filled, len(powers) - filled)
+			powers[filled:filled + count] = powers[:count] * np.uint64(step) % _PRIME
+			filled += count
+		self._powers[i] = powers
+		return powers
+
+def _coefficients(message):
+	# message bytes are packed in big endian 24 bits integers, zero padding the last one;
+	# the length is appended so that messages differing only by trailing zeros hash differently
+	padding = -len(message) % BLOCK_BYTES
+	blocks = np.frombuffer(bytes(message) + bytes(padding), dtype=np.uint8).reshape(-1, BLOCK_BYTES).astype(np.uint64)
+	values = (blocks[:, 0] << np.uint64(16)) | (blocks[:, 1] << np.uint64(8)) | blocks[:, 2]
+	return np.append(values, np.uint64(len(message) % PRIME))
+
+def serialize(announcement):
+	"""Converts an announcement to the bytes to authenticate
+
+	Bits are packed 8 per byte, preceded by their length;
+	lists of bases use one byte per basis; anything else is converted through its repr.
+
+	Parameters
+	----------
+	announcement : bitstring.Bits or list[int] or object
+
+	Returns
+	-------
+	message : bytes
+
+	"""
+	if isinstance(announcement, Bits):
+		return len(announcement).to_bytes(8, 'big') + announcement.tobytes()
+	if isinstance(announcement, (list, tuple)):
+		return bytes(announcement)
+	return repr(announcement).encode()
@@ -0,0 +1,129 @@
+import numpy as np
+from random import getrandbits
+from bb84.encoding import EncodingCircuit
+from bb84.decoding import Decoder
+from utils import bits_to_array, array_to_bits
+
+class Eavesdropper:
+	"""Intercept-resend attack on BB84 protocol.
+
+	Eve sits between Alice's Encoder and Bob's Decoder: each state is intercepted with probability
+	`fraction`, measured in a basis drawn according to `weights`, and a new state is prepared
+	according to the outcome and sent to Bob.
+
+	The attack can be run on the qiskit circuits (intercept), or through a vectorized simulation
+	that draws Bob's outcomes directly from the measurement statistics (simulate).
+
+	Parameters
+	----------
+	fraction : float
+	         probability of intercepting each state
+	weights : list[float]
+	        probability of measuring in each basis (0 -> Z, 1 -> X); uniform if None
+
+	Attributes
+	----------
+	intercepted : bitstring.Bits
+	            1 at the positions of the intercepted states (set by intercept and simulate)
+	e_bases : list[int]
+	        bases in which Eve measured
+	e_raw_key : bitstring.Bits
+	          Eve's outcomes (0 where the state was not intercepted)
+
+	"""
+
+	bases = (0,1)
+	_encoding_circuit = EncodingCircuit
+	_decoder = Decoder
+
+	def __init__(self, fraction=1.0, weights=None):
+		if weights is not None and len(weights) != len(self.bases):
+			raise ValueError(f'{len(weights)} weights given for {len(self.bases)} bases')
+		self.fraction = fraction
+		self.weights = weights
+		self.intercepted = None
+		self.e_bases = None
+		self.e_raw_key = None
+
+	def intercept(self, quantum_states):
+		"""Performs the attack on the states prepared by Alice
+
+		Parameters
+		----------
+		quantum_states: list[qiskit.QuantumCircuit]
+		              list of states prepared by Alice
+
+		Returns
+		-------
+		quantum_states: list[qiskit.QuantumCircuit]
+		              list of states received by Bob
+
+		"""
+
+		generator = np.random.default_rng(getrandbits(64))
+		self._choose(generator, len(quantum_states))
+
+		# Eve measures like Bob would do, skipping the states she lets through
+		self.e_raw_key = self._decoder().decode(self.e_bases, quantum_states, self.intercepted)
+
+		return [ self._encoding_circuit(self.e_raw_key[i], self.e_bases[i]).circuit if self.intercepted[i]
+				 else quantum_states[i]
+				 for i in range(len(quantum_states)) ]
+
+	def simulate(self, a_raw_key, a_bases, b_bases):
+		"""Vectorized simulation of the attack, without building circuits
+
+		Measuring in the preparation basis returns the prepared bit,
+		measuring in any other basis returns a uniformly random bit.
+
+		Parameters
+		----------
+		a_raw_key : bitstring.Bits
+		          Alice's raw key
+		a_bases : list[int]
+		        bases in which Alice prepares each state
+		b_bases : list[int]
+		        bases in which Bob performs his measures
+
+		Returns
+		-------
+		b_raw_key : bitstring.Bits
+		          Bob's raw key
+
+		"""
+
+		generator = np.random.default_rng(getrandbits(64))
+		length = len(a_bases)
+		self._choose(generator, length)
+		intercepted = bits_to_array(self.intercepted).astype(bool)
+		e_bases = np.asarray(self.e_bases)
+		a_bits = bits_to_array(a_raw_key)
+		a_bases = np.asarray(a_bases)
+		b_bases = np.asarray(b_bases)
+
+		e_bits = np.where(e_bases == a_bases, a_bits, generator.integers(0, 2, length))
+		e_bits = np.where(intercepted, e_bits, 0)
+		self.e_raw_key = array_to_bits(e_bits)
+
+		sent_bits = np.where(intercepted, e_bits, a_bits)
+		sent_bases = np.where(intercepted, e_bases, a_bases)
+		return array_to_bits(np.where(b_bases == sent_bases, sent_bits, generator.integers(0, 2, length)))
+
+	def expected_qber(self):
+		"""Error rate on the sifted key predicted by the theory
+
+		An intercepted state is measured in the wrong basis with probability 1 - 1/(number of bases),
+		whatever Eve's weights are, and then Bob gets a wrong bit with probability 1/2.
+
+		Returns
+		-------
+		qber : float
+
+		"""
+
+		return self.fraction * (1 - 1 / len(self.bases)) / 2
+
+	def _choose(self, generator, length):
+		intercepted = generator.random(length) < self.fraction
+		self.intercepted = array_to_bits(intercepted)
+		self.e_bases = generator.choice(self.bases, size=length, p=self.weights).tolist()
@@ -35,6 +35,17 @@ class Sifter:
 
 		return extract_sample(raw_key, self._bitvector)
 
+	def mask(self):
+		"""Returns the sifting mask: a bit is 1 if the corresponding raw key bit is kept
+
+		Returns
+		-------
+		mask : bitstring.Bits
+
+		"""
+
+		return self._bitvector
+
 	def _make_bitvector(self, a_bases, b_bases):
 		# bitvector act as a mask: if a bit is 1, the corresponding bit in the raw key is kept;
 		# since the bitwise XOR is 0 when the the bits are equal, according to the protocol,
@@ -0,0 +1,184 @@
+import numpy as np
+from bitstring import Bits
+
+class ClassicalChannel:
+	"""Simulated public channel between Alice and Bob.
+
+	Messages are delivered unchanged, while a simulated clock is advanced by
+	latency + size / bandwidth for each of them (messages are assumed to be sent one after the other).
+
+	Parameters
+	----------
+	latency : float
+	        one way latency, in seconds
+	bandwidth : float
+	          bandwidth in bits per second, None for unlimited bandwidth
+
+	Attributes
+	----------
+	clock : float
+	      simulated seconds spent transmitting
+	messages : int
+	         number of messages sent
+	bytes_sent : dict(str, int)
+	           bytes sent by each party
+
+	"""
+
+	def __init__(self, latency=0.0, bandwidth=None):
+		self.latency = latency
+		self.bandwidth = bandwidth
+		self.clock = 0.0
+		self.messages = 0
+		self.bytes_sent = {}
+
+	def send(self, sender, message):
+		"""Sends a message, accounting its size and transmission time
+
+		Parameters
+		----------
+		sender : str
+		       name of the party sending the message
+		message : bytes
+
+		Returns
+		-------
+		message : bytes
+		        the message as received by the other party
+
+		"""
+		self.messages += 1
+		self.bytes_sent[sender] = self.bytes_sent.get(sender, 0) + len(message)
+		self.clock += self.transfer_time(len(message))
+		return bytes(message)
+
+	def transfer_time(self, size):
+		"""Simulated seconds needed to deliver `size` bytes"""
+		if self.bandwidth is None:
+			return self.latency
+		return self.latency + 8 * size / self.bandwidth
+
+	def total_bytes(self):
+		return sum(self.bytes_sent.values())
+
+def encode_bases(bases, alphabet):
+	"""Bit-packs a list of bases
+
+	Bases in {0,1} use 1 bit each, bases in {0,1,2} use 2 bits each.
+
+	Parameters
+	----------
+	bases : list[int]
+	alphabet : int
+	         number of possible bases (2 or 3)
+
+	Returns
+	-------
+	message : bytes
+	        8 bytes holding the number of bases, 1 byte for the bits per basis, then the packed bases
+
+	"""
+	width = 1 if alphabet <= 2 else 2
+	values = np.asarray(bases, dtype=np.uint8)
+	shifts = np.arange(width - 1, -1, -1, dtype=np.uint8)
+	bits = (values[:, None] >> shifts) & 1
+	return len(values).to_bytes(8, 'big') + bytes([width]) + np.packbits(bits.ravel()).tobytes()
+
+def decode_bases(message):
+	"""Inverse of encode_bases
+
+	Returns
+	-------
+	bases : list[int]
+
+	"""
+	length = int.from_bytes(message[:8], 'big')
+	width = message[8]
+	bits = np.unpackbits(np.frombuffer(message[9:], dtype=np.uint8))[:length * width]
+	weights = 1 << np.arange(width - 1, -1, -1)
+	return (bits.reshape(length, width) * weights).sum(axis=1).tolist()
+
+def encode_mask(bitvector):
+	"""Packs a bitvector (e.g. a sifting or sampling mask) 8 bits per byte, preceded by its length"""
+	return len(bitvector).to_bytes(8, 'big') + Bits(bitvector).tobytes()
+
+def decode_mask(message):
+	"""Inverse of encode_mask
+
+	Returns
+	-------
+	bitvector : bitstring.Bits
+
+	"""
+	length = int.from_bytes(message[:8], 'big')
+	return Bits(message[8:])[:length]
+
+def encode_indices(bitvector):
+	"""Entropy codes the positions of the ones of a bitvector
+
+	The gaps between consecutive positions are Golomb-Rice coded, with the parameter
+	chosen from the mean gap; for sparse masks (e.g. the 2/9 of E91) this is shorter than the mask itself.
+
+	Parameters
+	----------
+	bitvector : bitstring.Bits
+
+	Returns
+	-------
+	message : bytes
+	        8 bytes for the mask length, 8 bytes for the number of ones,
+	        1 byte for the Rice parameter, then the packed codes
+
+	"""
+	mask = np.frombuffer(Bits(bitvector).tobytes(), dtype=np.uint8)
+	indices = np.flatnonzero(np.unpackbits(mask)[:len(bitvector)]).astype(np.int64)
+	gaps = np.diff(indices, prepend=-1) - 1
+	header = len(bitvector).to_bytes(8, 'big') + len(indices).to_bytes(8, 'big')
+	if len(indices) == 0:
+		return header + bytes(1)
+
+	parameter = int(np.log2(gaps.mean())) if gaps.mean() >= 1 else 0
+	quotients = gaps >> parameter
+	remainders = gaps & ((1 << parameter) - 1)
+
+	# each code is: quotient ones, a zero, then the remainder on `parameter` bits
+	lengths = quotients + 1 + parameter
+	starts = np.cumsum(lengths) - lengths
+	bits = np.zeros(int(lengths.sum()), dtype=np.uint8)
+	ones = np.repeat(starts - (np.cumsum(quotients) - quotients), quotients) + np.arange(quotients.sum())
+	bits[ones] = 1
+	for j in range(parameter):
+		bits[starts + quotients + 1 + j] = (remainders >> (parameter - 1 - j)) & 1
+
+	return header + bytes([parameter]) + np.packbits(bits).tobytes()
+
+def decode_indices(message):
+	"""Inverse of encode_indices
+
+	Returns
+	-------
+	bitvector : bitstring.Bits
+	          mask with ones at the decoded positions
+
+	"""
+	length = int.from_bytes(message[:8], 'big')
+	count = int.from_bytes(message[8:16], 'big')
+	parameter = message[16]
+	codes = np.unpackbits(np.frombuffer(message[17:], dtype=np.uint8)).tobytes()
+
+	# the unary part of each code is found with bytes.index, which runs in C
+	indices = np.empty(count, dtype=np.int64)
+	position = 0
+	previous = -1
+	for i in range(count):
+		terminator = codes.index(0, position)
+		gap = (terminator - position) << parameter
+		for j in range(parameter):
+			gap |= codes[terminator + 1 + j] << (parameter - 1 - j)
+		previous += gap + 1
+		indices[i] = previous
+		position = terminator + 1 + parameter
+
+	mask = np.zeros(length, dtype=np.uint8)
+	mask[indices] = 1
+	return Bits(np.packbits(mask).tobytes())[:length]
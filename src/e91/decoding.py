@@ -1,21 +1,34 @@
 from qiskit import QuantumCircuit, QuantumRegister, ClassicalRegister, Aer, transpile
-from qiskit.circuit.library import IGate, HGate, RYGate
-from math import pi
+from qiskit.circuit.library import RYGate
 from bitstring import Bits
+from e91.parameters import A_ANGLES, B_ANGLES
 
 class Decoder:
 	"""Decoder for E91 protocol.
 
 	Creates the raw keys for the two partecipants (Alice and Bob) to the protocol.
 
+	Parameters
+	----------
+	a_angles : tuple[float]
+	         directions (angles from the Z axis, in the ZX plane) of Alice's bases 0, 1, 2
+	b_angles : tuple[float]
+	         directions of Bob's bases 0, 1, 2
+
 	"""
 
-	def decode(self, a_bases, b_bases, quantum_states):
+	def __init__(self, a_angles=A_ANGLES, b_angles=B_ANGLES):
+		self.a_angles = tuple(a_angles)
+		self.b_angles = tuple(b_angles)
+
+	def decode(self, a_bases, b_bases, quantum_states, mask=None):
 		"""Creates the raw keys for Alice and Bob. 
 
 		The i-th bit of the key is created measuring the qubit in the basis
 		specified by the i-th element of a random list of integers
 		(a_bases for Alice, b_bases for Bob).
+		If a mask is given, only the pairs whose mask bit is 1 are measured (e.g. the ones used
+		for the key or for the CHSH parameter): the other bits of the keys are absent, and set to 0.
 
 		Parameters
 		----------
@@ -25,6 +38,8 @@ class Decoder:
 		 			 bases in which Bob performs his measures
 		quantum_states: list[qiskit.QuantumCircuit]
 		              list of Bell's states |PSI->
+		mask : bitstring.Bits
+		     positions to measure, all of them if None
 
 		Returns
 		-------
@@ -39,6 +54,10 @@ class Decoder:
 
 		# generates one bit at time
 		for i in range(len(a_bases)):
+			if mask is not None and not mask[i]:
+				a_raw_key.append(0)
+				b_raw_key.append(0)
+				continue
 			circuit = self._make_circuit(a_bases[i], b_bases[i], quantum_states[i])
 			bits = simulator.run(transpile(circuit, simulator), shots=1, memory=True).result().get_memory()[0]
 			# bits are string like '0 1', '1 1', ecc, where the first bit is relative to Bob's measure
@@ -58,7 +77,7 @@ class Decoder:
 									    ClassicalRegister(1, name='a'),
 									    ClassicalRegister(1, name='b') )
 		circuit.compose(quantum_state, inplace=True)
-		circuit.compose(DecodingCircuit(a_basis, b_basis).circuit, inplace=True)
+		circuit.compose(DecodingCircuit(a_basis, b_basis, self.a_angles, self.b_angles).circuit, inplace=True)
 		return circuit
 
 class DecodingCircuit:
@@ -67,7 +86,8 @@ class DecodingCircuit:
 	The circuit is created to perform mesurements
 	according to the given Alice's (a_basis) and Bob's bases (b_basis).
 	
-	Both a_basis and b_basis have values in {0,1,2}, with the following meaning:
+	Both a_basis and b_basis have values in {0,1,2}, and select a direction in the ZX plane
+	from a_angles and b_angles, respectively. With the default angles:
 
 	Alice:
 		0 -> Z basis
@@ -80,20 +100,9 @@ class DecodingCircuit:
 		2 -> (Z + X) / sqrt(2) basis
 
 	Since with qiskit is possible to measure only spin component in the Z basis
-	(that is, in the computational basis), a_basis and b_basis are interpreted as
-	values specifying the unitary transformation to apply to the state to obtain measurement results equivalent
-	to actually measure the qubit in the given basis:
-
-	Alice:
-		0 -> identity operator
-		1 -> Hadamard operator
-		2 -> rotation of -pi/4 about y axis
-	
-	Bob:
-		0 -> identity operator
-		1 -> rotation of pi/4 about y axis
-		2 -> rotation of -pi/4 about y axis
-
+	(that is, in the computational basis), the qubit is first rotated about the y axis
+	by minus the angle of the direction, which brings the direction onto the Z axis;
+	measuring in the computational basis is then equivalent to measuring along the direction.
 
 	Parameters
 	----------
@@ -101,6 +110,10 @@ class DecodingCircuit:
 	 			 basis in which Alice performs her measure
 	b_basis : int
 	 			 basis in which Bob performs his measure
+	a_angles : tuple[float]
+	         directions (angles from the Z axis, in the ZX plane) of Alice's bases
+	b_angles : tuple[float]
+	         directions of Bob's bases
 
 	Attributes
 	----------
@@ -109,36 +122,18 @@ class DecodingCircuit:
 
 	"""
 
-	def __init__(self, a_basis, b_basis):		
+	def __init__(self, a_basis, b_basis, a_angles=A_ANGLES, b_angles=B_ANGLES):
 		self.circuit = None
-		self._make_circuit(a_basis, b_basis)
+		self._make_circuit(a_angles[a_basis], b_angles[b_basis])
 
-	def _make_circuit(self, a_basis, b_basis):
+	def _make_circuit(self, a_angle, b_angle):
 		q = QuantumRegister(2, name='q')
 		a = ClassicalRegister(1, name='a')
 		b = ClassicalRegister(1, name='b')
 
 		self.circuit = QuantumCircuit(q, a, b)
 		# add gates to perform the appropriate unitary transformations
-		self.circuit.append(self._a_gate(a_basis), (q[0],))
-		self.circuit.append(self._b_gate(b_basis), (q[1],))
+		self.circuit.append(RYGate(-a_angle), (q[0],))
+		self.circuit.append(RYGate(-b_angle), (q[1],))
 		self.circuit.barrier()
 		self.circuit.measure([q[0],q[1]],[a[0],b[0]])
-
-	def _a_gate(self, a_basis):
-		# implements the logic to choose the appropriate gate for Alice
-		if a_basis == 0:
-			return IGate()
-		if a_basis == 1:
-			return HGate()
-		if a_basis == 2:
-			return RYGate(-pi/4)
-
-	def _b_gate(self, b_basis):
-		# implements the logic to choose the appropriate gate for Bob
-		if b_basis == 0:
-			return IGate()
-		if b_basis == 1:
-			return RYGate(pi/4)
-		if b_basis == 2:
-			return RYGate(-pi/4)
\ No newline at end of file
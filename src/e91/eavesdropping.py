@@ -0,0 +1,206 @@
+import numpy as np
+from random import getrandbits
+from math import pi
+from bitstring import Bits
+from qiskit import QuantumCircuit, QuantumRegister, ClassicalRegister, Aer, transpile
+from utils import bits_to_array, array_to_bits
+from e91.parameters import A_ANGLES, B_ANGLES, parallel_pairs
+from e91.estimation import chsh_terms
+
+class Eavesdropper:
+	"""Partial-measurement attack on E91 protocol.
+
+	Eve gets hold of Bob's half of each Bell's state with probability `fraction` and measures it
+	along a direction drawn from `angles` according to `weights`; the pair collapses in a product state,
+	with Bob's qubit in the eigenstate Eve found, and Alice's qubit in the opposite one.
+
+	The attack can be run on the qiskit circuits (intercept), or through a vectorized simulation
+	that draws the outcomes directly from the correlations of |PSI-> (simulate).
+
+	Parameters
+	----------
+	fraction : float
+	         probability of measuring each pair
+	angles : list[float]
+	       directions (angles from the Z axis, in the ZX plane) along which Eve measures;
+	       by default, the directions of the key bases
+	weights : list[float]
+	        probability of each direction; uniform if None
+	a_angles, b_angles : tuple[float]
+	                   directions of Alice's and Bob's bases, as in e91.decoding.Decoder
+	key_pairs : tuple[tuple[int, int]]
+	          pairs of bases making the key, as in e91.sifting.Sifter; the parallel ones if None
+	terms : tuple[tuple[int, int, int]]
+	      terms of the CHSH parameter, as in e91.estimation.Estimator; derived from the angles if None
+
+	Attributes
+	----------
+	intercepted : bitstring.Bits
+	            1 at the positions of the measured pairs (set by intercept and simulate)
+	e_angles : list[float]
+	         directions along which Eve measured
+	e_raw_key : bitstring.Bits
+	          Eve's outcomes (0 where the pair was not measured)
+
+	"""
+
+	def __init__(self, fraction=1.0, angles=(0, pi/4), weights=None, a_angles=A_ANGLES, b_angles=B_ANGLES,
+				 key_pairs=None, terms=None):
+		if weights is not None and len(weights) != len(angles):
+			raise ValueError(f'{len(weights)} weights given for {len(angles)} directions')
+		self.fraction = fraction
+		self.angles = angles
+		self.weights = weights
+		self.a_angles = tuple(a_angles)
+		self.b_angles = tuple(b_angles)
+		self.key_pairs = tuple(key_pairs) if key_pairs is not None else parallel_pairs(self.a_angles, self.b_angles)
+		self.terms = tuple(terms) if terms is not None else chsh_terms(self.a_angles, self.b_angles, self.key_pairs)
+		self.intercepted = None
+		self.e_angles = None
+		self.e_raw_key = None
+
+	def intercept(self, quantum_states):
+		"""Performs the attack on the Bell's states
+
+		Parameters
+		----------
+		quantum_states: list[qiskit.QuantumCircuit]
+		              list of Bell's states |PSI->
+
+		Returns
+		-------
+		quantum_states: list[qiskit.QuantumCircuit]
+		              list of states shared by Alice and Bob after the attack
+
+		"""
+
+		generator = np.random.default_rng(getrandbits(64))
+		self._choose(generator, len(quantum_states))
+
+		simulator = Aer.get_backend('aer_simulator')
+		e_raw_key = []
+		states = []
+
+		for i in range(len(quantum_states)):
+			if not self.intercepted[i]:
+				e_raw_key.append(0)
+				states.append(quantum_states[i])
+				continue
+			circuit = self._make_circuit(self.e_angles[i], quantum_states[i])
+			bit = int(simulator.run(transpile(circuit, simulator), shots=1, memory=True).result().get_memory()[0])
+			e_raw_key.append(bit)
+			states.append(CollapsedStateCircuit(bit, self.e_angles[i]).circuit)
+
+		self.e_raw_key = Bits(e_raw_key)
+		return states
+
+	def simulate(self, a_bases, b_bases):
+		"""Vectorized simulation of the protocol under attack, without building circuits
+
+		For |PSI->, the outcomes along directions at angles x and y are equal with probability (1 - cos(x - y)) / 2.
+
+		Parameters
+		----------
+		a_bases : list[int]
+		 			 bases in which Alice performs her measures
+		b_bases : list[int]
+		 			 bases in which Bob performs his measures
+
+		Returns
+		-------
+		a_raw_key, b_raw_key : bitstring.Bits, bitstring.Bits
+		                       the raw keys for Alice and Bob, respectively
+
+		"""
+
+		generator = np.random.default_rng(getrandbits(64))
+		length = len(a_bases)
+		self._choose(generator, length)
+		intercepted = bits_to_array(self.intercepted).astype(bool)
+		alpha = np.take(self.a_angles, a_bases)
+		beta = np.take(self.b_angles, b_bases)
+		epsilon = np.asarray(self.e_angles)
+
+		a_bits = generator.integers(0, 2, length)
+		# untouched pairs: Bob's outcome is drawn given Alice's one
+		honest = _flip_unless(generator, a_bits, (1 - np.cos(alpha - beta)) / 2)
+		# measured pairs: Eve's outcome is drawn given Alice's one, then Bob measures Eve's eigenstate
+		e_bits = _flip_unless(generator, a_bits, (1 - np.cos(alpha - epsilon)) / 2)
+		attacked = _flip_unless(generator, e_bits, (1 + np.cos(beta - epsilon)) / 2)
+
+		self.e_raw_key = array_to_bits(np.where(intercepted, e_bits, 0))
+		return array_to_bits(a_bits), array_to_bits(np.where(intercepted, attacked, honest))
+
+	def expected_correlation(self, a_basis, b_basis):
+		"""Expectation value of AiBj predicted by the theory
+
+		It is -cos(x - y) for untouched pairs, and -cos(x - e)cos(y - e) for pairs measured by Eve along e.
+
+		Returns
+		-------
+		correlation : float
+
+		"""
+
+		alpha, beta = self.a_angles[a_basis], self.b_angles[b_basis]
+		weights = self.weights if self.weights is not None else [1 / len(self.angles)] * len(self.angles)
+		attacked = sum(-w * np.cos(alpha - e) * np.cos(beta - e) for e, w in zip(self.angles, weights))
+		return float((1 - self.fraction) * -np.cos(alpha - beta) + self.fraction * attacked)
+
+	def expected_chsh(self):
+		"""CHSH parameter predicted by the theory (<A0B1> + <A0B2> + <A1B2> - <A1B1> with the default angles)"""
+		return sum(sign * self.expected_correlation(a_basis, b_basis) for a_basis, b_basis, sign in self.terms)
+
+	def expected_qber(self):
+		"""Fraction of equal bits (the sifted keys should be complementary) predicted by the theory"""
+		return sum((1 + self.expected_correlation(a_basis, b_basis)) / 2 for a_basis, b_basis in self.key_pairs) / len(self.key_pairs)
+
+	def _choose(self, generator, length):
+		intercepted = generator.random(length) < self.fraction
+		self.intercepted = array_to_bits(intercepted)
+		self.e_angles = generator.choice(self.angles, size=length, p=self.weights).tolist()
+
+	def _make_circuit(self, e_angle, quantum_state):
+		# Eve rotates Bob's qubit so that her direction becomes the Z axis, then measures it
+		q = QuantumRegister(2, name='q')
+		e = ClassicalRegister(1, name='e')
+		circuit = QuantumCircuit(q, e)
+		circuit.compose(quantum_state, inplace=True)
+		circuit.ry(-e_angle, q[1])
+		circuit.measure([q[1]], [e[0]])
+		return circuit
+
+class CollapsedStateCircuit:
+	""" Qiskit circuit to create the state left by Eve's measurement
+
+	If Eve finds the outcome e_bit measuring Bob's qubit along e_angle, Bob's qubit is left in that eigenstate
+	and Alice's qubit in the opposite one: RY(e_angle)|not e_bit> x RY(e_angle)|e_bit>.
+
+	Parameters
+	----------
+	e_bit : int
+	      Eve's outcome
+	e_angle : float
+	        direction along which Eve measured
+
+	Attributes
+	----------
+	circuit : qiskit.QuantumCircuit
+	        circuit to create the state
+
+	"""
+
+	def __init__(self, e_bit, e_angle):
+		self.circuit = None
+		self._make_circuit(e_bit, e_angle)
+
+	def _make_circuit(self, e_bit, e_angle):
+		self.circuit = QuantumCircuit(2)
+		self.circuit.x(1 if e_bit else 0)
+		self.circuit.ry(e_angle, 0)
+		self.circuit.ry(e_angle, 1)
+		self.circuit.barrier()
+
+def _flip_unless(generator, bits, probability_same):
+	# returns bits, each one flipped with probability 1 - probability_same
+	return np.where(generator.random(len(bits)) < probability_same, bits, 1 - bits)
@@ -1,7 +1,14 @@
+from itertools import combinations
+from math import cos
+import numpy as np
+from bitstring import Bits
+from e91.parameters import A_ANGLES, B_ANGLES, parallel_pairs
+
 class Estimator:
 	""" Class to estimate the CHSH parameter
 
-	The parameter is estimated according to:
+	The terms of the parameter are given, or derived from the measurement angles (see chsh_terms);
+	with the default angles, the parameter is estimated according to:
 	<A0B1> + <A0B2> + <A1B2> - <A1B1>, where:
 
 	A0 -> Z operator
@@ -11,10 +18,30 @@ class Estimator:
 
 	and the expectation value is taken respect to the state |PSI->.
 
+	Parameters
+	----------
+	a_angles : tuple[float]
+	         directions (angles from the Z axis, in the ZX plane) of Alice's bases
+	b_angles : tuple[float]
+	         directions of Bob's bases
+	terms : tuple[tuple[int, int, int]]
+	      (Alice's basis, Bob's basis, sign) of each term; derived from the angles if None
+	key_pairs : tuple[tuple[int, int]]
+	          pairs of bases making the key, excluded from the derived terms; the parallel ones if None
+
+	Attributes
+	----------
+	terms : tuple[tuple[int, int, int]]
+	      (Alice's basis, Bob's basis, sign) of each term of the parameter
+
 	"""
 
-	def __init__(self):
-		# each element of _counts is relative to, respectively:
+	def __init__(self, a_angles=A_ANGLES, b_angles=B_ANGLES, terms=None, key_pairs=None):
+		self.terms = tuple(tuple(term) for term in terms) if terms is not None else chsh_terms(a_angles, b_angles, key_pairs)
+		self._index = { (a_basis, b_basis) : i for i, (a_basis, b_basis, sign) in enumerate(self.terms) }
+
+		# each element of _counts is relative to the term with the same index in terms,
+		# with the default angles, respectively:
 		#
 		# 0 -> A0B1
 		# 1 -> A0B2
@@ -30,7 +57,7 @@ class Estimator:
 		#
 		# the binary value extracted from the pair is used to index the subarray
 
-		self._counts = [[0,0,0,0], [0,0,0,0],[0,0,0,0],[0,0,0,0]]
+		self._counts = [[0,0,0,0] for term in self.terms]
 		self._means = []
 
 	def estimate(self, a_raw_key, b_raw_key, a_bases, b_bases):
@@ -53,14 +80,61 @@ class Estimator:
 
 		"""
 
+		# Bits(...)[i] is a boolean value, so it's needed to get the string with .bin;
+		# the strings are built once, since .bin converts the whole key
+		a_bin, b_bin = a_raw_key.bin, b_raw_key.bin
 		for i in range(len(a_raw_key)):
-			# Bits(...)[i] is a boolean value, so it's needed to get the string with .bin
-			self._update_counts(a_raw_key.bin[i], b_raw_key.bin[i], a_bases[i], b_bases[i])
+			self._update_counts(a_bin[i], b_bin[i], a_bases[i], b_bases[i])
 
 		for array in self._counts:
 			self._means.append(self._mean(array))
 
-		return self._means[0] + self._means[1] + self._means[2] - self._means[3]
+		return sum(sign * mean for (a_basis, b_basis, sign), mean in zip(self.terms, self._means))
+
+	def estimate_arrays(self, a_raw_bits, b_raw_bits, a_bases, b_bases):
+		"""Vectorized version of estimate, on numpy arrays
+
+		Parameters
+		----------
+		a_raw_bits, b_raw_bits : numpy.ndarray
+		                       Alice's and Bob's outcomes, one 0 or 1 per pair
+		a_bases, b_bases : numpy.ndarray
+		                 bases of Alice's and Bob's measures
+
+		Returns
+		-------
+		CHSH parameter : float
+
+		"""
+
+		a_bases, b_bases = np.asarray(a_bases), np.asarray(b_bases)
+		# the outcome of AiBj is 1 for equal bits, -1 for different ones
+		products = 1 - 2 * (np.asarray(a_raw_bits) != np.asarray(b_raw_bits))
+		for a_basis, b_basis, sign in self.terms:
+			selected = (a_bases == a_basis) & (b_bases == b_basis)
+			self._means.append(float(products[selected].mean()) if selected.any() else 0)
+
+		return sum(sign * mean for (a_basis, b_basis, sign), mean in zip(self.terms, self._means))
+
+	def mask(self, a_bases, b_bases):
+		"""Returns a bitvector with 1 at the positions used to estimate the parameter
+
+		Parameters
+		----------
+		a_bases : list[int]
+		 			 bases in which Alice performs her measures
+		b_bases : list[int]
+		 			 bases in which Bob performs his measures
+
+		Returns
+		-------
+		mask : bitstring.Bits
+
+		"""
+
+		return Bits([ 0 if self._first_index_map(a_bases[i], b_bases[i]) is None
+					  else 1
+					  for i in range(len(a_bases)) ])
 
 	def _update_counts(self, a_raw_bit, b_raw_bit, a_basis, b_basis):
 		i = self._first_index_map(a_basis, b_basis)
@@ -83,17 +157,56 @@ class Estimator:
 			return 0
 
 	def _first_index_map(self, a_basis, b_basis):
-		if a_basis == 0 and b_basis == 1: #A0B1
-			return 0
-		if a_basis == 0 and b_basis == 2: #A0B2
-			return 1
-		if a_basis == 1 and b_basis == 2: #A1B2
-			return 2
-		if a_basis == 1 and b_basis == 1: #A1B1
-			return 3
-		return None
+		return self._index.get((a_basis, b_basis))
 
 	def _second_index_map(self, a_raw_bit, b_raw_bit):
 		#(a_raw_bit, b_raw_bit) = ('0','0') or ('0','1') or ('1','0') or ('1', '1')
 		# so 0 or 1 or 2 or 3 is returned
 		return int(a_raw_bit + b_raw_bit, base=2)
+
+def chsh_terms(a_angles=A_ANGLES, b_angles=B_ANGLES, key_pairs=None, correlation=None):
+	"""Derives the terms of the CHSH parameter from the measurement angles
+
+	Two of Alice's bases and two of Bob's bases give four pairs, one of which enters with a minus sign.
+	Pairs used for the key are excluded, since their outcomes must stay secret;
+	among the remaining choices, the one with the largest predicted |CHSH| is taken.
+
+	Parameters
+	----------
+	a_angles : tuple[float]
+	         directions (angles from the Z axis, in the ZX plane) of Alice's bases
+	b_angles : tuple[float]
+	         directions of Bob's bases
+	key_pairs : tuple[tuple[int, int]]
+	          pairs of bases making the key; the parallel ones (e91.parameters.parallel_pairs) if None
+	correlation : callable
+	            expectation value of AB along directions at angles x (Alice) and y (Bob), e.g. the one of
+	            e91.optimization.NoiseModel; -cos(x - y), the one of |PSI->, if None
+
+	Returns
+	-------
+	terms : tuple[tuple[int, int, int]]
+	      (Alice's basis, Bob's basis, sign) of each term, the negative one last
+
+	"""
+
+	key_pairs = parallel_pairs(a_angles, b_angles) if key_pairs is None else tuple(tuple(pair) for pair in key_pairs)
+	correlation = correlation if correlation is not None else lambda x, y: -cos(x - y)
+
+	best, terms = None, None
+	for a_pair in combinations(range(len(a_angles)), 2):
+		for b_pair in combinations(range(len(b_angles)), 2):
+			pairs = [ (i, j) for i in a_pair for j in b_pair ]
+			if any(pair in key_pairs for pair in pairs):
+				continue
+			correlations = [ float(correlation(a_angles[i], b_angles[j])) for i, j in pairs ]
+			for minus in range(len(pairs)):
+				value = abs(sum(correlations) - 2 * correlations[minus])
+				# ties keep the first choice, so that rounding errors do not reorder the terms
+				if best is None or value > best + 1e-9:
+					best = value
+					terms = tuple((i, j, 1) for k, (i, j) in enumerate(pairs) if k != minus) + (pairs[minus] + (-1,),)
+
+	if terms is None:
+		raise ValueError('no CHSH combination avoids the key pairs')
+	return terms
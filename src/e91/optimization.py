@@ -0,0 +1,211 @@
+import numpy as np
+from functools import lru_cache
+from math import pi
+from e91.parameters import KEY_PAIRS, parallel_pairs
+from e91.estimation import chsh_terms
+
+# terms of the CHSH parameter searched by AngleOptimizer: <A0B1> + <A0B2> + <A1B2> - <A1B1>
+CHSH_TERMS = ((0,1,1), (0,2,1), (1,2,1), (1,1,-1))
+
+class NoiseModel:
+	"""Noise acting on the pairs shared by Alice and Bob.
+
+	With visibility V, misalignment d and flip probability p, the expectation value of the product
+	of the outcomes (+1 or -1) along directions at angles x (Alice) and y (Bob) is -V(1 - 2p)cos(x - y - d).
+
+	Parameters
+	----------
+	visibility : float
+	           fraction of the pairs left in |PSI->, the other ones being replaced by white noise
+	misalignment : float
+	             rotation of Bob's reference frame with respect to Alice's one, in radians
+	flip : float
+	     probability of flipping each of Bob's outcomes (the noise of qkd.pipeline.Session)
+
+	"""
+
+	def __init__(self, visibility=1.0, misalignment=0.0, flip=0.0):
+		self.visibility = visibility
+		self.misalignment = misalignment
+		self.flip = flip
+
+	def correlation(self, alpha, beta):
+		"""Expectation value of AB, vectorized over the angles
+
+		Parameters
+		----------
+		alpha : float or numpy.ndarray
+		      directions of Alice's measures
+		beta : float or numpy.ndarray
+		     directions of Bob's measures
+
+		Returns
+		-------
+		correlation : float or numpy.ndarray
+
+		"""
+
+		return -self.visibility * (1 - 2 * self.flip) * np.cos(np.subtract(alpha, beta) - self.misalignment)
+
+	def _key(self):
+		return (self.visibility, self.misalignment, self.flip)
+
+class AngleOptimizer:
+	"""Searches the measurement angles of E91 protocol over a dense grid.
+
+	The bases keep their roles: the pairs in e91.parameters.KEY_PAIRS make the key, and Alice's bases 0, 1
+	with Bob's bases 1, 2 give the CHSH parameter <A0B1> + <A0B2> + <A1B2> - <A1B1> (CHSH_TERMS).
+	Under a misalignment the key pairs of the optimal settings are not parallel, so the settings carry
+	their key pairs and terms, to be passed to qkd.pipeline.E91Session.
+	Since the correlations only depend on the differences of the angles, Alice's basis 0 is fixed at 0.
+
+	The table of the correlations between all the grid directions is computed once (and cached,
+	for each resolution and noise model); the CHSH parameter then splits in a part depending on B1
+	and one depending on B2, so that for every A1 the best B1 and B2 are found with a maximum over the table rows.
+	The key bases are chosen to minimize the errors on the key pairs.
+
+	Parameters
+	----------
+	noise : NoiseModel
+	      noise on the pairs; noiseless if None
+	resolution : int
+	           number of directions of the grid, evenly spaced over the whole circle
+
+	Attributes
+	----------
+	grid : numpy.ndarray
+	     directions of the grid, in [0, 2pi)
+
+	"""
+
+	def __init__(self, noise=None, resolution=720):
+		self.noise = noise if noise is not None else NoiseModel()
+		self.resolution = resolution
+		self.grid = 2 * pi * np.arange(resolution) / resolution
+
+	def correlation_table(self):
+		"""Correlations between all the directions of the grid
+
+		Returns
+		-------
+		table : numpy.ndarray
+		      read only, table[i, j] is the expectation value of AB along grid[i] (Alice) and grid[j] (Bob)
+
+		"""
+
+		return _correlation_table(self.resolution, *self.noise._key())
+
+	def chsh_landscape(self):
+		"""Largest |CHSH| reachable for every direction of Alice's basis 1 (basis 0 being at 0)
+
+		Returns
+		-------
+		chsh : numpy.ndarray
+		     signed CHSH parameter of largest absolute value, for each direction in grid
+		b1, b2 : numpy.ndarray, numpy.ndarray
+		       indices in grid of Bob's directions reaching it
+
+		"""
+
+		table = self.correlation_table()
+		# CHSH = (T[0, b1] - T[a1, b1]) + (T[0, b2] + T[a1, b2]): the two terms are optimized independently
+		b1_part = table[0] - table
+		b2_part = table[0] + table
+		rows = np.arange(self.resolution)
+
+		highest_b1, highest_b2 = b1_part.argmax(axis=1), b2_part.argmax(axis=1)
+		lowest_b1, lowest_b2 = b1_part.argmin(axis=1), b2_part.argmin(axis=1)
+		highest = b1_part[rows, highest_b1] + b2_part[rows, highest_b2]
+		lowest = b1_part[rows, lowest_b1] + b2_part[rows, lowest_b2]
+
+		# ties go to the negative sign, the one of |PSI-> with the default angles
+		use_lowest = -lowest >= highest
+		return (np.where(use_lowest, lowest, highest),
+				np.where(use_lowest, lowest_b1, highest_b1),
+				np.where(use_lowest, lowest_b2, highest_b2))
+
+	def optimize(self):
+		"""Finds the angles giving the largest |CHSH|, with key bases giving the fewest errors
+
+		Returns
+		-------
+		settings : dict
+		         as returned by evaluate, with key_pairs KEY_PAIRS and terms CHSH_TERMS
+
+		"""
+
+		table = self.correlation_table()
+		chsh, b1, b2 = self.chsh_landscape()
+		a1 = int(np.abs(chsh).argmax())
+		b1, b2 = int(b1[a1]), int(b2[a1])
+
+		# the sifted keys should be complementary, so the key pairs want correlations close to -1
+		b0 = int(table[0].argmin())
+		a2 = int(table[:, b2].argmin())
+
+		a_angles = tuple(_wrap(self.grid[[0, a1, a2]]))
+		b_angles = tuple(_wrap(self.grid[[b0, b1, b2]]))
+		return self.evaluate(a_angles, b_angles, KEY_PAIRS, CHSH_TERMS)
+
+	def evaluate(self, a_angles, b_angles, key_pairs=None, terms=None):
+		"""Figures of merit predicted for the given angles under the noise model
+
+		Key pairs and CHSH terms not given are derived as the Estimator would do,
+		but with the correlations of the noise model.
+		With bases drawn uniformly, the sifted fraction is the fraction of pulses measured in a key pair;
+		the key rate is the sifted fraction times the device independent bound
+		1 - h(QBER) - h((1 + sqrt((CHSH/2)^2 - 1)) / 2) on the secret bits per sifted bit (0 if |CHSH| <= 2).
+
+		Parameters
+		----------
+		a_angles, b_angles : tuple[float]
+		                   directions of Alice's and Bob's bases
+		key_pairs : tuple[tuple[int, int]]
+		          pairs of bases making the key; the parallel ones if None
+		terms : tuple[tuple[int, int, int]]
+		      (Alice's basis, Bob's basis, sign) of each CHSH term; derived from the angles if None
+
+		Returns
+		-------
+		settings : dict
+		         a_angles, b_angles, key_pairs, terms, chsh, qber, sifted_fraction, key_rate
+
+		"""
+
+		key_pairs = tuple(key_pairs) if key_pairs is not None else parallel_pairs(a_angles, b_angles)
+		if terms is None:
+			terms = chsh_terms(a_angles, b_angles, key_pairs, self.noise.correlation)
+		correlation = lambda a_basis, b_basis: float(self.noise.correlation(a_angles[a_basis], b_angles[b_basis]))
+		chsh = sum(sign * correlation(a_basis, b_basis) for a_basis, b_basis, sign in terms)
+		qber = sum((1 + correlation(a_basis, b_basis)) / 2 for a_basis, b_basis in key_pairs) / len(key_pairs)
+		sifted_fraction = len(key_pairs) / (len(a_angles) * len(b_angles))
+
+		secret_fraction = 0.0
+		if abs(chsh) > 2:
+			secret_fraction = max(0.0, 1 - _entropy(qber) - _entropy((1 + np.sqrt((chsh / 2) ** 2 - 1)) / 2))
+
+		return { 'a_angles' : tuple(float(angle) for angle in a_angles),
+				 'b_angles' : tuple(float(angle) for angle in b_angles),
+				 'key_pairs' : tuple(tuple(pair) for pair in key_pairs),
+				 'terms' : tuple(tuple(term) for term in terms),
+				 'chsh' : chsh,
+				 'qber' : qber,
+				 'sifted_fraction' : sifted_fraction,
+				 'key_rate' : sifted_fraction * secret_fraction }
+
+@lru_cache(maxsize=8)
+def _correlation_table(resolution, visibility, misalignment, flip):
+	grid = 2 * pi * np.arange(resolution) / resolution
+	table = NoiseModel(visibility, misalignment, flip).correlation(grid[:, None], grid[None, :])
+	table.flags.writeable = False
+	return table
+
+def _wrap(angles):
+	# angles in (-pi, pi]
+	return pi - np.mod(pi - angles, 2 * pi)
+
+def _entropy(p):
+	# binary entropy, in bits
+	if p <= 0 or p >= 1:
+		return 0.0
+	return float(-p * np.log2(p) - (1 - p) * np.log2(1 - p))
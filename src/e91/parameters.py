@@ -1,3 +1,14 @@
+from math import pi, remainder
+
+# measurement directions in the ZX plane, as angles from the Z axis, of the default bases:
+# Alice measures along Z, X, (Z + X) / sqrt(2), and Bob along Z, (Z - X) / sqrt(2), (Z + X) / sqrt(2)
+A_ANGLES = (0, pi/2, pi/4)
+B_ANGLES = (0, -pi/4, pi/4)
+
+# pairs of bases (Alice's, Bob's) whose outcomes make the key with the default angles:
+# Z for both, and (Z + X) / sqrt(2) for both
+KEY_PAIRS = ((0,0), (2,2))
+
 class EncodeParameters:
 	def __init__(self, length):
 		self.length = length
@@ -14,4 +25,31 @@ class SifterParameters:
 		self.b_directions = b_directions
 
 class EstimateParameters:
-	pass
\ No newline at end of file
+	pass
+
+def parallel_pairs(a_angles=A_ANGLES, b_angles=B_ANGLES):
+	"""Derives the pairs of bases making the key from the measurement angles: the parallel ones
+
+	The key is made by the pairs measured along the same direction, whose outcomes are anti-correlated for |PSI->.
+	Settings whose key pairs are not parallel (e.g. compensating a misalignment, see e91.optimization)
+	must be given explicitly.
+
+	Parameters
+	----------
+	a_angles : tuple[float]
+	         directions (angles from the Z axis, in the ZX plane) of Alice's bases
+	b_angles : tuple[float]
+	         directions of Bob's bases
+
+	Returns
+	-------
+	pairs : tuple[tuple[int, int]]
+	      (Alice's basis, Bob's basis) of each key pair
+
+	"""
+
+	pairs = tuple((i, j) for i, alpha in enumerate(a_angles) for j, beta in enumerate(b_angles)
+				  if abs(remainder(alpha - beta, 2 * pi)) < 1e-9)
+	if not pairs:
+		raise ValueError('no basis of Alice is parallel to a basis of Bob, so there is no key pair')
+	return pairs
@@ -1,5 +1,6 @@
 from bitstring import Bits
 from utils import extract_sample
+from e91.parameters import KEY_PAIRS
 
 class Sifter:
 	""" Class to perform sifting of a raw key according to E91 protocol.
@@ -10,10 +11,13 @@ class Sifter:
 		 			 bases in which Alice performs her measures
 		b_bases : list[int]
 		 			 bases in which Bob performs his measures
+		key_pairs : tuple[tuple[int, int]]
+		          pairs of bases (Alice's, Bob's) whose outcomes make the key (see e91.parameters.parallel_pairs)
 
 	"""
 
-	def __init__(self, a_bases, b_bases):
+	def __init__(self, a_bases, b_bases, key_pairs=KEY_PAIRS):
+		self._key_pairs = tuple(tuple(pair) for pair in key_pairs)
 		self._bitvector = None
 		self._make_bitvector(a_bases, b_bases)
 
@@ -33,6 +37,17 @@ class Sifter:
 
 		return extract_sample(raw_key, self._bitvector)
 
+	def mask(self):
+		"""Returns the sifting mask: a bit is 1 if the corresponding raw key bit is kept
+
+		Returns
+		-------
+		mask : bitstring.Bits
+
+		"""
+
+		return self._bitvector
+
 	def _make_bitvector(self, a_bases, b_bases):
 		# bitvector act as a mask: if a bit is 1, the corresponding bit in the raw key is kept
 		self._bitvector = Bits( [ 1 if self._same_basis(a_bases[i], b_bases[i])
@@ -40,5 +55,4 @@ class Sifter:
 								  for i in range(len(a_bases)) ] )
 
 	def _same_basis(self, a_basis, b_basis): 
-		# 0 indicates Z basis, and 2 indicates (Z + X) / sqrt(2) basis for both Alice and Bob
-		return a_basis == b_basis and (a_basis == 0 or a_basis == 2)
+		return (a_basis, b_basis) in self._key_pairs
@@ -0,0 +1,317 @@
+import argparse
+import json
+import random
+import sys
+from math import radians, degrees, isnan
+from bitstring import Bits
+from channel import ClassicalChannel
+from authentication import Authenticator, KeyExhaustedError
+from randomness import RandomnessSuite
+from qkd.pipeline import SESSIONS
+from qkd.network import Network
+from e91.parameters import A_ANGLES, B_ANGLES, parallel_pairs
+from e91.estimation import chsh_terms
+from e91.optimization import AngleOptimizer, NoiseModel
+
+def main(argv=None):
+	"""Entry point of the command line interface.
+
+	Example (from the src directory):
+
+	python -m qkd run --protocol bb84 --pulses 10000 --workers 4 --seed 1 --noise 0.05 --out transcript.json
+
+	Returns
+	-------
+	exit status : int
+	            0 if the session is acceptable, 1 if a threshold is exceeded
+
+	"""
+
+	args = _make_parser().parse_args(argv)
+	return args.command(args)
+
+def _make_parser():
+	parser = argparse.ArgumentParser(prog='qkd', description='Headless runner for QKD protocol sessions')
+	commands = parser.add_subparsers(title='commands', required=True)
+
+	run = commands.add_parser('run', help='run a full protocol session and print a summary')
+	run.add_argument('--protocol', choices=sorted(SESSIONS), default='bb84')
+	run.add_argument('--pulses', type=_positive_int, default=1000, help='number of pulses sent by the source')
+	run.add_argument('--workers', type=_positive_int, default=1, help='processes used to decode the quantum states')
+	run.add_argument('--seed', type=int, default=None,
+					 help='seed for the classical random choices (keys, bases, noise, sampling)')
+	run.add_argument('--noise', type=float, default=0.0, help="probability of flipping each bit of Bob's raw key")
+	run.add_argument('--max-qber', type=float, default=0.11, help='highest acceptable QBER')
+	run.add_argument('--min-chsh', type=float, default=2.0,
+					 help='lowest acceptable absolute value of the CHSH parameter (E91 only)')
+	run.add_argument('--auth-key-bits', type=int, default=0,
+					 help='length of the pre-shared key used to authenticate the classical channel (0 disables it); '
+						  'the hash keys take 124 bits, and each message 124 more')
+	run.add_argument('--latency', type=float, default=0.0, help='one way latency of the classical channel, in seconds')
+	run.add_argument('--bandwidth', type=float, default=None,
+					 help='bandwidth of the classical channel, in bits per second (unlimited by default)')
+	run.add_argument('--index-sifting', action='store_true',
+					 help='Alice announces the entropy coded sifted positions instead of her bases')
+	run.add_argument('--sample-fraction', type=_fraction, default=0.5,
+					 help='fraction of the sifted key sacrificed to estimate the QBER (BB84 and SSP)')
+	run.add_argument('--qber-width', type=_positive_float, default=None,
+					 help='size the sample for a 95%% confidence interval of this half width on the QBER')
+	run.add_argument('--lazy', action='store_true',
+					 help='simulate only the pulses that contribute to the sifted key or to the estimators')
+	run.add_argument('--eve-fraction', type=float, default=0.0,
+					 help='fraction of the states attacked by an eavesdropper (intercept-resend, '
+						  'or measurement of Bob\'s qubit for E91)')
+	run.add_argument('--analytic', action='store_true',
+					 help='draw the raw keys with the vectorized simulation instead of running the circuits')
+	run.add_argument('--a-angles', type=_angles, default=A_ANGLES,
+					 help="comma separated directions of Alice's bases, in degrees from the Z axis (E91 only)")
+	run.add_argument('--b-angles', type=_angles, default=B_ANGLES,
+					 help="comma separated directions of Bob's bases, in degrees from the Z axis (E91 only)")
+	run.add_argument('--out', default=None, help='file where the JSON transcript of the session is written')
+	run.set_defaults(command=_run)
+
+	sweep = commands.add_parser('sweep', help='compare QBER and CHSH under attack with the theory, without circuits')
+	sweep.add_argument('--protocol', choices=sorted(SESSIONS), default='bb84')
+	sweep.add_argument('--pulses', type=_positive_int, default=100000, help='number of pulses for each configuration')
+	sweep.add_argument('--steps', type=_positive_int, default=11,
+					   help='number of interception fractions, evenly spaced in [0, 1]')
+	sweep.add_argument('--weights', type=_weights, default=None,
+					   help="comma separated probabilities of Eve's bases (Z,X for bb84, Z,X,Y for ssp), "
+							'or of her directions (0, pi/4 for e91); uniform by default')
+	sweep.add_argument('--seed', type=int, default=None)
+	sweep.set_defaults(command=_sweep)
+
+	randomness = commands.add_parser('randomness', help='run the NIST SP 800-22 style tests on a file of packed key bits')
+	randomness.add_argument('path', help='file holding the key bits, 8 per byte')
+	randomness.add_argument('--workers', type=_positive_int, default=1, help='processes used to test the chunks')
+	randomness.add_argument('--chunk-bits', type=_positive_int, default=None, help='bits read at a time')
+	randomness.add_argument('--alpha', type=float, default=0.01, help='significance level of the tests')
+	randomness.set_defaults(command=_randomness)
+
+	network = commands.add_parser('network', help='simulate a trusted-node network relaying keys hop by hop')
+	network.add_argument('--links', required=True, help='comma separated links, e.g. A-B,B-C,C-D')
+	network.add_argument('--demands', required=True,
+						 help='comma separated demands source-destination:bits[xcount], e.g. A-D:1024x10')
+	network.add_argument('--protocol', choices=sorted(SESSIONS), default='bb84')
+	network.add_argument('--pulses', type=_positive_int, default=10000, help='pulses of each link session')
+	network.add_argument('--noise', type=float, default=0.0, help="probability of flipping each bit of Bob's raw key")
+	network.add_argument('--capacity', type=_positive_int, default=100000, help='size of each link key buffer, in bits')
+	network.add_argument('--latency', type=float, default=0.0, help='one way latency of the links classical channels')
+	network.add_argument('--circuits', action='store_true', help='run the qiskit circuits instead of the vectorized simulation')
+	network.add_argument('--workers', type=_positive_int, default=1, help='processes running the link sessions')
+	network.add_argument('--seed', type=int, default=None)
+	network.set_defaults(command=_network)
+
+	optimize = commands.add_parser('optimize', help='search the E91 measurement angles under a noise model')
+	optimize.add_argument('--visibility', type=float, default=1.0, help='fraction of the pairs left in |PSI->')
+	optimize.add_argument('--misalignment', type=float, default=0.0,
+						  help="rotation of Bob's reference frame, in degrees")
+	optimize.add_argument('--noise', type=float, default=0.0, help="probability of flipping each bit of Bob's raw key")
+	optimize.add_argument('--resolution', type=_positive_int, default=720, help='number of directions of the grid')
+	optimize.add_argument('--confirm-pulses', type=int, default=0,
+						  help='pulses of a session run on the circuits with the chosen angles (0 skips it)')
+	optimize.add_argument('--workers', type=_positive_int, default=1, help='processes used to decode the quantum states')
+	optimize.add_argument('--seed', type=int, default=None)
+	optimize.set_defaults(command=_optimize)
+
+	return parser
+
+def _run(args):
+	if args.seed is not None:
+		random.seed(args.seed)
+
+	authentication_key = None
+	if args.auth_key_bits > 0:
+		authentication_key = Bits(random.choices((0,1), k=args.auth_key_bits))
+
+	session_class = SESSIONS[args.protocol]
+	angles = {}
+	if args.protocol == 'e91':
+		angles = { 'a_angles' : args.a_angles, 'b_angles' : args.b_angles }
+		try:
+			# the session derives both the key pairs and the CHSH terms from the angles
+			chsh_terms(args.a_angles, args.b_angles, parallel_pairs(args.a_angles, args.b_angles))
+		except ValueError as error:
+			print(f'FAILED: {error}', file=sys.stderr)
+			return 1
+	eavesdropper = None
+	if args.eve_fraction > 0:
+		eavesdropper = session_class.eavesdropping.Eavesdropper(args.eve_fraction, **angles)
+
+	channel = ClassicalChannel(args.latency, args.bandwidth)
+	session = None
+	try:
+		session = session_class(args.pulses, **angles, noise=args.noise, workers=args.workers,
+										  authentication_key=authentication_key,
+										  channel=channel,
+										  index_sifting=args.index_sifting,
+										  sample_fraction=args.sample_fraction,
+										  qber_width=args.qber_width,
+										  lazy=args.lazy,
+										  eavesdropper=eavesdropper,
+										  analytic=args.analytic)
+		report = session.run()
+	except KeyExhaustedError as error:
+		# the hash keys are drawn when the session is created, then the message that ran out had not been sent yet
+		messages = channel.messages + 1 if session is not None else 0
+		print(f'FAILED: authentication key exhausted ({error}): a session takes {Authenticator.required_bits(0)} bits '
+			  f'for the hash keys plus {Authenticator.required_bits(1) - Authenticator.required_bits(0)} per message, '
+			  f'at least {Authenticator.required_bits(messages)} bits are needed', file=sys.stderr)
+		return 1
+	print(report.summary())
+
+	# a session without an estimate is not acceptable either
+	failures = []
+	if report.qber is None or isnan(report.qber):
+		failures.append('no qber estimate (no sifted bits left to sample)')
+	elif report.qber > args.max_qber:
+		failures.append(f'qber {report.qber} exceeds {args.max_qber}')
+	if args.protocol == 'e91':
+		if report.chsh is None or isnan(report.chsh):
+			failures.append('no chsh estimate')
+		elif abs(report.chsh) < args.min_chsh:
+			failures.append(f'|chsh| {abs(report.chsh)} below {args.min_chsh}')
+
+	if args.out is not None:
+		transcript = report.as_dict()
+		transcript['arguments'] = { key : value for key, value in vars(args).items() if key != 'command' }
+		transcript['failures'] = failures
+		with open(args.out, 'w') as file:
+			json.dump(transcript, file, indent=2)
+
+	for failure in failures:
+		print(f'FAILED: {failure}', file=sys.stderr)
+	return 1 if failures else 0
+
+def _sweep(args):
+	if args.seed is not None:
+		random.seed(args.seed)
+
+	session_class = SESSIONS[args.protocol]
+	session = session_class(args.pulses)
+	try:
+		session_class.eavesdropping.Eavesdropper(0, weights=args.weights)
+	except ValueError as error:
+		print(f'FAILED: {error}', file=sys.stderr)
+		return 1
+
+	print('fraction  qber      expected  chsh      expected')
+	for step in range(args.steps):
+		fraction = step / (args.steps - 1) if args.steps > 1 else 1.0
+		eavesdropper = session_class.eavesdropping.Eavesdropper(fraction, weights=args.weights)
+		qber, chsh = session.simulate_attack(eavesdropper)
+		line = f'{fraction:<9.3f} {qber:<9.4f} {eavesdropper.expected_qber():<9.4f}'
+		if chsh is not None:
+			line += f' {chsh:<9.4f} {eavesdropper.expected_chsh():<9.4f}'
+		print(line)
+	return 0
+
+def _randomness(args):
+	p_values = RandomnessSuite().test_file(args.path, workers=args.workers, chunk_bits=args.chunk_bits)
+	if all(isnan(p_value) for p_value in p_values.values()):
+		print(f'FAILED: no test is applicable to {args.path} (empty file?)', file=sys.stderr)
+		return 1
+	failures = [name for name, p_value in p_values.items() if p_value < args.alpha]
+	for name, p_value in p_values.items():
+		print(f'{name:<20}: {p_value:.6f}{"  FAILED" if name in failures else ""}')
+	return 1 if failures else 0
+
+def _network(args):
+	if args.seed is not None:
+		random.seed(args.seed)
+
+	simulation = Network(workers=args.workers)
+	try:
+		for a_node, b_node in _links(args.links):
+			simulation.add_link(a_node, b_node, protocol=args.protocol, pulses=args.pulses, capacity=args.capacity,
+								latency=args.latency, noise=args.noise, analytic=not args.circuits)
+		for demand in _demands(args.demands):
+			simulation.add_demand(*demand)
+		# unknown nodes and demands larger than a buffer are only found when the demands are served
+		results = simulation.run()
+	except ValueError as error:
+		print(f'FAILED: {error}', file=sys.stderr)
+		return 1
+
+	print('pair        hops  bits        rate (bits/s)  latency (s)  error rate')
+	for (source, destination), result in results.items():
+		print(f'{source + "-" + destination:<11} {result["hops"]:<5} {result["delivered_bits"]:<11} '
+			  f'{result["rate"]:<14.1f} {result["mean_latency"]:<12.4f} {result["error_rate"]:.4f}')
+	return 0
+
+def _optimize(args):
+	if args.seed is not None:
+		random.seed(args.seed)
+
+	noise = NoiseModel(args.visibility, radians(args.misalignment), args.noise)
+	settings = AngleOptimizer(noise, args.resolution).optimize()
+	print(f'alice angles    : {", ".join(f"{degrees(angle):.2f}" for angle in settings["a_angles"])}')
+	print(f'bob angles      : {", ".join(f"{degrees(angle):.2f}" for angle in settings["b_angles"])}')
+	print(f'key pairs       : {", ".join(f"A{a_basis}B{b_basis}" for a_basis, b_basis in settings["key_pairs"])}')
+	print(f'chsh            : {settings["chsh"]:.4f}')
+	print(f'qber            : {settings["qber"]:.4f}')
+	print(f'sifted fraction : {settings["sifted_fraction"]:.4f}')
+	print(f'key rate        : {settings["key_rate"]:.4f} bits/pulse')
+
+	if args.confirm_pulses > 0:
+		# the circuits only reproduce the bit flips, so they are compared with the prediction for that noise alone
+		structure = { key : settings[key] for key in ('a_angles', 'b_angles', 'key_pairs', 'terms') }
+		expected = AngleOptimizer(NoiseModel(flip=args.noise)).evaluate(**structure)
+		session = SESSIONS['e91'](args.confirm_pulses, **structure, noise=args.noise, workers=args.workers, lazy=True)
+		report = session.run()
+		print(f'circuits        : chsh {report.chsh:.4f} (expected {expected["chsh"]:.4f}), '
+			  f'qber {report.qber:.4f} (expected {expected["qber"]:.4f})')
+	return 0
+
+def _links(value):
+	# 'A-B,B-C' -> [('A', 'B'), ('B', 'C')]
+	links = []
+	for link in value.split(','):
+		nodes = link.split('-')
+		if len(nodes) != 2 or not all(nodes):
+			raise ValueError(f'malformed link {link!r}, expected two nodes as in A-B')
+		links.append(tuple(nodes))
+	return links
+
+def _demands(value):
+	# 'A-D:1024x10,B-C:256' -> [('A', 'D', 1024, 10), ('B', 'C', 256, 1)]
+	demands = []
+	for demand in value.split(','):
+		nodes, _, size = demand.partition(':')
+		nodes = nodes.split('-')
+		key_length, _, count = size.partition('x')
+		if len(nodes) != 2 or not all(nodes) or not key_length.isdigit() or not (count or '1').isdigit():
+			raise ValueError(f'malformed demand {demand!r}, expected source-destination:bits[xcount] as in A-D:1024x10')
+		demands.append((nodes[0], nodes[1], int(key_length), int(count or 1)))
+	return demands
+
+def _weights(value):
+	weights = [float(weight) for weight in value.split(',')]
+	if any(weight < 0 for weight in weights) or sum(weights) <= 0:
+		raise argparse.ArgumentTypeError(f'{value} are not non negative weights with a positive sum')
+	# normalized, since numpy wants probabilities summing to 1
+	return [weight / sum(weights) for weight in weights]
+
+def _angles(value):
+	angles = tuple(radians(float(angle)) for angle in value.split(','))
+	if len(angles) != 3:
+		raise argparse.ArgumentTypeError(f'{value} does not hold three angles')
+	return angles
+
+def _positive_int(value):
+	number = int(value)
+	if number <= 0:
+		raise argparse.ArgumentTypeError(f'{value} is not a positive integer')
+	return number
+
+def _positive_float(value):
+	number = float(value)
+	if not number > 0:
+		raise argparse.ArgumentTypeError(f'{value} is not a positive number')
+	return number
+
+def _fraction(value):
+	number = float(value)
+	if not 0 < number < 1:
+		raise argparse.ArgumentTypeError(f'{value} is not in the open interval (0, 1)')
+	return number
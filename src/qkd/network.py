@@ -0,0 +1,281 @@
+import asyncio
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from bitstring import Bits
+from channel import ClassicalChannel
+from qkd.pipeline import SESSIONS
+
+class KeyBuffer:
+	"""Key shared by the two ends of a link, filled by the link sessions.
+
+	Each end keeps its own copy, since without error correction the copies can differ.
+
+	Parameters
+	----------
+	capacity : int
+	         bits above which the link stops producing key, until some is consumed
+
+	"""
+
+	def __init__(self, capacity):
+		self.capacity = capacity
+		self._keys = (Bits(), Bits())
+		self._changed = None
+
+	def available(self):
+		return len(self._keys[0])
+
+	async def deposit(self, a_key, b_key):
+		"""Appends the final keys of a session, waiting while the buffer is full"""
+		async with self._condition():
+			await self._changed.wait_for(lambda: self.available() < self.capacity)
+			self._keys = (self._keys[0] + a_key, self._keys[1] + b_key)
+			self._changed.notify_all()
+
+	async def withdraw(self, length):
+		"""Removes `length` bits, waiting until they are available
+
+		Returns
+		-------
+		a_bits, b_bits : bitstring.Bits, bitstring.Bits
+		               the bits of the two copies
+
+		"""
+		async with self._condition():
+			await self._changed.wait_for(lambda: self.available() >= length)
+			bits = (self._keys[0][:length], self._keys[1][:length])
+			self._keys = (self._keys[0][length:], self._keys[1][length:])
+			self._changed.notify_all()
+			return bits
+
+	def _condition(self):
+		# created inside the running event loop (with python 3.9 it would be bound to the loop current at creation)
+		if self._changed is None:
+			self._changed = asyncio.Condition()
+		return self._changed
+
+class Link:
+	"""QKD link between two nodes, running one protocol session after the other.
+
+	Parameters
+	----------
+	a_node, b_node : str
+	               nodes playing Alice and Bob
+	protocol : str
+	         'bb84', 'ssp' or 'e91'
+	pulses : int
+	       pulses of each session
+	capacity : int
+	         size of the key buffer, in bits
+	latency : float
+	        one way latency of the classical channel, in seconds
+	session_options : dict
+	                further arguments of the sessions (e.g. noise, analytic)
+
+	Attributes
+	----------
+	buffer : KeyBuffer
+	channel : channel.ClassicalChannel
+	        channel carrying the relayed keys
+	sessions : int
+	         number of sessions run so far
+	produced : int
+	         key bits produced so far
+
+	"""
+
+	def __init__(self, a_node, b_node, protocol='bb84', pulses=10000, capacity=100000, latency=0.0, **session_options):
+		self.a_node = a_node
+		self.b_node = b_node
+		self.protocol = protocol
+		self.pulses = pulses
+		self.session_options = session_options
+		self.buffer = KeyBuffer(capacity)
+		self.channel = ClassicalChannel(latency)
+		self.sessions = 0
+		self.produced = 0
+
+	async def produce(self, executor, stop):
+		"""Runs sessions in the executor and fills the buffer, until `stop` is set"""
+		loop = asyncio.get_running_loop()
+		session = SESSIONS[self.protocol](self.pulses, **self.session_options)
+		while not stop.is_set():
+			# worker processes would share the state of the random module, so each session gets its own seed
+			a_key, b_key = await loop.run_in_executor(executor, _run_session, session, random.getrandbits(64))
+			self.sessions += 1
+			self.produced += len(a_key)
+			await self.buffer.deposit(a_key, b_key)
+
+	async def withdraw(self, node, length):
+		"""Takes `length` bits from the buffer
+
+		Returns
+		-------
+		own_bits, other_bits : bitstring.Bits, bitstring.Bits
+		                     the copy of `node`, and the copy of the other end
+
+		"""
+		a_bits, b_bits = await self.buffer.withdraw(length)
+		return (a_bits, b_bits) if node == self.a_node else (b_bits, a_bits)
+
+class Network:
+	"""Trusted-node QKD network.
+
+	Links produce key concurrently on an asyncio event loop, with the sessions run by a pool of processes.
+	End-to-end keys are relayed hop by hop along the shortest path: the source uses the key of the first link
+	as the end-to-end key, and every trusted node forwards it encrypted (XOR, one-time-pad) with the key of the next link.
+
+	Parameters
+	----------
+	workers : int
+	        processes running the link sessions
+
+	"""
+
+	def __init__(self, workers=1):
+		self.workers = workers
+		self.links = {}
+		self._demands = []
+
+	def add_link(self, a_node, b_node, **options):
+		"""Adds a link between two nodes; options are passed to Link
+
+		Returns
+		-------
+		link : Link
+
+		"""
+		link = Link(a_node, b_node, **options)
+		self.links[frozenset((a_node, b_node))] = link
+		return link
+
+	def add_demand(self, source, destination, key_length, count=1):
+		"""Requests `count` end-to-end keys of `key_length` bits between two nodes"""
+		if source == destination:
+			raise ValueError(f'the demand {source}-{destination} does not join two different nodes')
+		if key_length <= 0 or count <= 0:
+			raise ValueError(f'the demand {source}-{destination} requests {count} keys of {key_length} bits, both must be positive')
+		self._demands.append((source, destination, key_length, count))
+
+	def path(self, source, destination):
+		"""Shortest path (breadth first search) between two nodes
+
+		Returns
+		-------
+		nodes : list[str]
+
+		"""
+		neighbours = {}
+		for link in self.links.values():
+			neighbours.setdefault(link.a_node, []).append(link.b_node)
+			neighbours.setdefault(link.b_node, []).append(link.a_node)
+
+		previous = {source : None}
+		queue = deque([source])
+		while queue:
+			node = queue.popleft()
+			if node == destination:
+				break
+			for neighbour in neighbours.get(node, []):
+				if neighbour not in previous:
+					previous[neighbour] = node
+					queue.append(neighbour)
+
+		if destination not in previous:
+			raise ValueError(f'no path between {source} and {destination}')
+		nodes = [destination]
+		while previous[nodes[-1]] is not None:
+			nodes.append(previous[nodes[-1]])
+		return nodes[::-1]
+
+	def run(self):
+		"""Runs the simulation until all the demands are served
+
+		Returns
+		-------
+		results : dict(tuple(str, str), dict)
+		        for each (source, destination), over all its demands: delivered bits, rate (bits/s),
+		        mean latency of the keys (s), hops, and error rate between the source and destination
+		        copies of the end-to-end keys
+
+		"""
+		return asyncio.run(self._run())
+
+	async def _run(self):
+		stop = asyncio.Event()
+		loop = asyncio.get_running_loop()
+		start = loop.time()
+		with ProcessPoolExecutor(max_workers=self.workers) as executor:
+			producers = [asyncio.ensure_future(link.produce(executor, stop)) for link in self.links.values()]
+			served = asyncio.ensure_future(asyncio.gather(*[self._serve(loop, start, *demand) for demand in self._demands]))
+			# producers only return on error, in which case the demands would never be served
+			await asyncio.wait([served, *producers], return_when=asyncio.FIRST_COMPLETED)
+			stop.set()
+			for task in [served, *producers]:
+				task.cancel()
+			outcomes = await asyncio.gather(*producers, return_exceptions=True)
+
+		failures = [outcome for outcome in outcomes if isinstance(outcome, Exception) and not isinstance(outcome, asyncio.CancelledError)]
+		if failures:
+			raise failures[0]
+
+		# several demands between the same nodes are reported together
+		pairs = {}
+		for demand, result in zip(self._demands, served.result()):
+			pairs.setdefault((demand[0], demand[1]), []).append(result)
+		return { pair : _pair_result(results) for pair, results in pairs.items() }
+
+	async def _serve(self, loop, start, source, destination, key_length, count):
+		nodes = self.path(source, destination)
+		for i in range(len(nodes) - 1):
+			if key_length > self.links[frozenset((nodes[i], nodes[i + 1]))].buffer.capacity:
+				raise ValueError(f'{key_length} bits do not fit in the buffer of the link {nodes[i]}-{nodes[i + 1]}')
+		latencies = []
+		errors = 0
+		for i in range(count):
+			requested = loop.time()
+			source_key, destination_key = await self._relay(nodes, key_length)
+			latencies.append(loop.time() - requested)
+			errors += (source_key ^ destination_key).count(1)
+
+		return { 'delivered_bits' : key_length * count,
+				 'elapsed' : loop.time() - start,
+				 'latencies' : latencies,
+				 'hops' : len(nodes) - 1,
+				 'errors' : errors }
+
+	async def _relay(self, nodes, key_length):
+		# the key bits of all the hops are reserved concurrently
+		hops = [self.links[frozenset((nodes[i], nodes[i + 1]))] for i in range(len(nodes) - 1)]
+		keys = await asyncio.gather(*[hop.withdraw(nodes[i], key_length) for i, hop in enumerate(hops)])
+
+		# the source's copy of the first link key is the end-to-end key
+		key = keys[0][0]
+		received = keys[0][1]
+		for i in range(1, len(hops)):
+			# the trusted node nodes[i] encrypts what it received with the next link key
+			message = received ^ keys[i][0]
+			delivered = hops[i].channel.send(nodes[i], message.tobytes())
+			await asyncio.sleep(hops[i].channel.transfer_time(len(delivered)))
+			received = Bits(delivered)[:key_length] ^ keys[i][1]
+		return key, received
+
+def _pair_result(results):
+	# figures of merit of all the demands between two nodes: the rate is measured
+	# until the last of them is served, the latency is averaged over all the keys
+	delivered = sum(result['delivered_bits'] for result in results)
+	elapsed = max(result['elapsed'] for result in results)
+	latencies = [latency for result in results for latency in result['latencies']]
+	errors = sum(result['errors'] for result in results)
+	return { 'delivered_bits' : delivered,
+			 'rate' : delivered / elapsed if elapsed > 0 else float('inf'),
+			 'mean_latency' : sum(latencies) / len(latencies) if latencies else 0.0,
+			 'hops' : results[0]['hops'],
+			 'error_rate' : errors / delivered if delivered else 0.0 }
+
+def _run_session(session, seed):
+	# module level function, so that it can be sent to the worker processes
+	random.seed(seed)
+	session.run()
+	return session.a_key, session.b_key
@@ -0,0 +1,477 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from random import choices, getrandbits
+from time import perf_counter
+import numpy as np
+from bitstring import Bits
+from scipy.spatial.distance import hamming
+from utils import Sampler, add_noise, extract_sample, bits_to_array, array_to_bits
+from authentication import Authenticator, KeyPool, serialize
+from channel import ClassicalChannel, encode_bases, decode_bases, encode_indices, decode_indices
+import bb84.encoding, bb84.decoding, bb84.sifting, bb84.estimation, bb84.eavesdropping
+import ssp.encoding, ssp.decoding, ssp.sifting, ssp.estimation, ssp.eavesdropping
+import e91.encoding, e91.decoding, e91.sifting, e91.estimation, e91.eavesdropping, e91.parameters
+
+class Report:
+	"""Summary of a protocol session.
+
+	Collects the timing of every stage of the pipeline, together with
+	the figures of merit of the session (sifted length, QBER, CHSH parameter).
+
+	Parameters
+	----------
+	protocol : str
+	         name of the protocol
+	pulses : int
+	       number of pulses sent by the source
+
+	Attributes
+	----------
+	stages : list[tuple(str, int, float)]
+	       (stage name, processed pulses, elapsed seconds) for each stage
+	sifted_length : int
+	qber : float
+	     None if there were no bits to estimate it
+	chsh : float
+	     CHSH parameter, None for prepare-and-measure protocols
+	final_length : int
+	             length of the key left after parameter estimation
+	simulated_pulses : int
+	                 pulses actually run through the simulator
+	authenticated_bytes : int
+	                    bytes of classical messages authenticated, None without authentication
+	authentication_key_bits : int
+	                        key bits consumed by authentication
+	channel_bytes : int
+	              bytes sent over the classical channel (tags included)
+	channel_messages : int
+	                 messages sent over the classical channel
+	channel_seconds : float
+	                simulated time spent on the classical channel
+
+	"""
+
+	def __init__(self, protocol, pulses):
+		self.protocol = protocol
+		self.pulses = pulses
+		self.stages = []
+		self.sifted_length = None
+		self.qber = None
+		self.chsh = None
+		self.final_length = None
+		self.simulated_pulses = None
+		self.authenticated_bytes = None
+		self.authentication_key_bits = None
+		self.channel_bytes = None
+		self.channel_messages = None
+		self.channel_seconds = None
+
+	@contextmanager
+	def stage(self, name, pulses=None):
+		"""Context manager timing the enclosed block as the stage `name`
+
+		If pulses is None, the stage is accounted with the pulses actually simulated (simulated_pulses,
+		as set within the block), so that lazy decoding reports the speed of the simulator.
+
+		"""
+		start = perf_counter()
+		yield
+		self.stages.append((name, pulses if pulses is not None else self.simulated_pulses, perf_counter() - start))
+
+	def as_dict(self):
+		return { 'protocol' : self.protocol,
+				 'pulses' : self.pulses,
+				 'sifted_length' : self.sifted_length,
+				 'qber' : self.qber,
+				 'chsh' : self.chsh,
+				 'final_length' : self.final_length,
+				 'simulated_pulses' : self.simulated_pulses,
+				 'authenticated_bytes' : self.authenticated_bytes,
+				 'authentication_key_bits' : self.authentication_key_bits,
+				 'channel_bytes' : self.channel_bytes,
+				 'channel_messages' : self.channel_messages,
+				 'channel_seconds' : self.channel_seconds,
+				 'stages' : [ { 'name' : name,
+								'pulses' : pulses,
+								'seconds' : seconds,
+								'pulses_per_second' : _rate(pulses, seconds) }
+							  for name, pulses, seconds in self.stages ] }
+
+	def summary(self):
+		"""Human readable summary of the session, one line per entry"""
+		lines = [f'protocol      : {self.protocol}',
+				 f'pulses        : {self.pulses}',
+				 f'sifted length : {self.sifted_length}',
+				 f'final length  : {self.final_length}',
+				 f'simulated     : {self.simulated_pulses}',
+				 f'qber          : {self.qber}']
+		if self.chsh is not None:
+			lines.append(f'chsh          : {self.chsh}')
+		if self.authenticated_bytes is not None:
+			lines.append(f'auth bytes    : {self.authenticated_bytes} '
+						 f'({self.authentication_key_bits} key bits, '
+						 f'{self.authentication_key_bits / max(self.authenticated_bytes, 1):.4f} bits/byte)')
+		if self.channel_bytes is not None:
+			lines.append(f'channel       : {self.channel_bytes} bytes in {self.channel_messages} messages, '
+						 f'{self.channel_seconds:.3f} s simulated')
+		for name, pulses, seconds in self.stages:
+			lines.append(f'{name:<14}: {seconds:.3f} s, {_rate(pulses, seconds):.1f} pulses/s')
+		return '\n'.join(lines)
+
+class Session:
+	"""Headless run of a full protocol pipeline.
+
+	Subclasses provide the protocol specific stages; decoding, which dominates
+	the running time, is split in contiguous chunks across `workers` processes.
+
+	Parameters
+	----------
+	pulses : int
+	       number of pulses sent by the source
+	noise : float
+	      probability of flipping each bit of Bob's raw key
+	workers : int
+	        number of processes used to decode the quantum states
+	authentication_key : bitstring.Bits
+	                   key pre-shared by Alice and Bob; when given, every classical
+	                   announcement is authenticated with a Wegman-Carter tag
+	channel : channel.ClassicalChannel
+	        channel carrying the classical announcements; by default one without latency
+	index_sifting : bool
+	              if True, Alice answers Bob's bases with the entropy coded positions
+	              of the sifted bits, instead of announcing her own bases
+	sample_fraction : float
+	                fraction of the sifted key sacrificed to estimate the QBER
+	qber_width : float
+	           if given, the sample is sized to get a confidence interval on the QBER
+	           of this half width, instead of using sample_fraction
+	lazy : bool
+	     if True, the bases are used to decide up front which pulses survive sifting
+	     (or are needed by the estimator), and only those are simulated
+	eavesdropper : bb84.eavesdropping.Eavesdropper, ssp.eavesdropping.Eavesdropper or e91.eavesdropping.Eavesdropper
+	             attack performed on the quantum states before decoding, None for no attack
+	analytic : bool
+	         if True, no circuit is built: the raw keys are drawn by the vectorized
+	         simulation of the eavesdropping module (with an eavesdropper intercepting nothing, if there is none)
+
+	Attributes
+	----------
+	a_key, b_key : bitstring.Bits
+	             Alice's and Bob's final keys, set by run (Bob's E91 key is inverted, so that it matches Alice's one)
+
+	"""
+
+	name = None
+
+	def __init__(self, pulses, noise=0.0, workers=1, authentication_key=None, channel=None, index_sifting=False,
+				 sample_fraction=0.5, qber_width=None, lazy=False, eavesdropper=None, analytic=False):
+		self.pulses = pulses
+		self.noise = noise
+		self.workers = workers
+		self.channel = channel if channel is not None else ClassicalChannel()
+		self.index_sifting = index_sifting
+		self.sample_fraction = sample_fraction
+		self.qber_width = qber_width
+		self.lazy = lazy
+		self.eavesdropper = eavesdropper
+		self.analytic = analytic
+		self.a_key = None
+		self.b_key = None
+		self._authenticators = None
+		if authentication_key is not None:
+			# each party holds its own copy of the pre-shared key
+			self._authenticators = (Authenticator(KeyPool(authentication_key)),
+									Authenticator(KeyPool(authentication_key)))
+
+	def run(self):
+		"""Runs the session
+
+		Returns
+		-------
+		report : Report
+
+		"""
+		raise NotImplementedError
+
+	def simulate_attack(self, eavesdropper):
+		"""Runs the vectorized simulation of the protocol under the given attack
+
+		No circuit is built, so that many attack configurations can be compared with the theory.
+
+		Returns
+		-------
+		qber, chsh : float, float
+		           chsh is None for prepare-and-measure protocols
+
+		"""
+		raise NotImplementedError
+
+	def _eavesdrop(self, report, states):
+		if self.eavesdropper is None or self.analytic:
+			return states
+		with report.stage('eavesdrop', self.pulses):
+			return self.eavesdropper.intercept(states)
+
+	def _send(self, sender, message):
+		# the sender appends the tag to the message, the receiver recomputes it;
+		# AuthenticationError is raised if they differ
+		if self._authenticators is None:
+			return self.channel.send(sender, message)
+		tagger, verifier = self._authenticators
+		tag = tagger.tag(message)
+		received = self.channel.send(sender, message + tag)
+		message, tag = received[:-len(tag)], received[-len(tag):]
+		verifier.verify(message, tag)
+		return message
+
+	def _announce(self, sender, announcement):
+		# announcements that are only needed for accounting and authentication
+		self._send(sender, serialize(announcement))
+
+	def _sift(self, sifter_class, alphabet, a_bases, b_bases, a_raw_key, b_raw_key):
+		# Bob announces his bases, so that Alice can sift her key
+		received_b_bases = decode_bases(self._send('bob', encode_bases(b_bases, alphabet)))
+		a_sifter = sifter_class(a_bases, received_b_bases)
+		a_sifted_key = a_sifter.sift(a_raw_key)
+
+		if self.index_sifting:
+			# Alice tells Bob which bits are kept
+			b_mask = decode_indices(self._send('alice', encode_indices(a_sifter.mask())))
+			b_sifted_key = extract_sample(b_raw_key, b_mask)
+		else:
+			received_a_bases = decode_bases(self._send('alice', encode_bases(a_bases, alphabet)))
+			b_sifted_key = sifter_class(received_a_bases, b_bases).sift(b_raw_key)
+
+		return a_sifted_key, b_sifted_key
+
+	def _channel_report(self, report):
+		report.channel_bytes = self.channel.total_bytes()
+		report.channel_messages = self.channel.messages
+		report.channel_seconds = self.channel.clock
+		if self._authenticators is not None:
+			tagger = self._authenticators[0]
+			report.authenticated_bytes = tagger.authenticated_bytes
+			report.authentication_key_bits = tagger.consumed_bits
+
+	def _simulate(self, report, *columns):
+		eavesdropper = self.eavesdropper if self.eavesdropper is not None else self._honest_eavesdropper()
+		report.simulated_pulses = len(columns[0])
+		return eavesdropper.simulate(*columns)
+
+	def _honest_eavesdropper(self):
+		# eavesdropper intercepting nothing, used by the vectorized simulation when there is no attack
+		return self.eavesdropping.Eavesdropper(0)
+
+	def _decode(self, report, decoder, *columns, mask=None):
+		report.simulated_pulses = len(columns[0]) if mask is None else mask.count(1)
+		if mask is not None:
+			columns = columns + (mask,)
+
+		# with a single worker there is no point in paying for the process pool
+		if self.workers <= 1:
+			return decoder.decode(*columns)
+
+		bounds = _chunk_bounds(len(columns[0]), self.workers)
+		jobs = [(decoder, [column[start:stop] for column in columns]) for start, stop in bounds]
+		# the workers are spawned, not forked: the eavesdropper may have already started the simulator
+		# in this process, and a forked copy of its threads deadlocks
+		with ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+			results = list(executor.map(_decode_chunk, jobs))
+
+		# E91 decoders return both raw keys, the other ones only Bob's
+		if isinstance(results[0], tuple):
+			return tuple(Bits().join(keys) for keys in zip(*results))
+		return Bits().join(results)
+
+class BB84Session(Session):
+	"""Session running the BB84 protocol"""
+
+	name = 'bb84'
+	bases = (0,1)
+	encoding, decoding, sifting, estimation = bb84.encoding, bb84.decoding, bb84.sifting, bb84.estimation
+	eavesdropping = bb84.eavesdropping
+
+	def run(self):
+		report = Report(self.name, self.pulses)
+
+		with report.stage('encode', self.pulses):
+			a_raw_key = Bits(choices((0,1), k=self.pulses))
+			a_bases = choices(self.bases, k=self.pulses)
+			states = None if self.analytic else self.encoding.Encoder().encode(a_raw_key, a_bases)
+
+		states = self._eavesdrop(report, states)
+
+		with report.stage('decode'):
+			b_bases = choices(self.bases, k=self.pulses)
+			# in the simulation the bases are known before measuring,
+			# so the pulses that would be discarded by sifting can be skipped
+			if self.analytic:
+				b_raw_key = self._simulate(report, a_raw_key, a_bases, b_bases)
+			else:
+				mask = self.sifting.Sifter(a_bases, b_bases).mask() if self.lazy else None
+				b_raw_key = self._decode(report, self.decoding.Decoder(), b_bases, states, mask=mask)
+			if self.noise:
+				b_raw_key = add_noise(b_raw_key, self.noise)
+
+		with report.stage('sift', self.pulses):
+			a_sifted_key, b_sifted_key = self._sift(self.sifting.Sifter, len(self.bases),
+													a_bases, b_bases, a_raw_key, b_raw_key)
+		report.sifted_length = len(a_sifted_key)
+
+		with report.stage('estimate', len(a_sifted_key)):
+			a_sampler = Sampler(a_sifted_key, fraction=self.sample_fraction, width=self.qber_width)
+			# Alice tells Bob which bits she used to extract the sample
+			sampling_bitvector = decode_indices(self._send('alice', encode_indices(a_sampler.sampling_bitvector)))
+			b_sampler = Sampler(b_sifted_key, sampling_bitvector)
+			a_sample, b_sample = a_sampler.sample(), b_sampler.sample()
+			self._announce('alice', a_sample)
+			self._announce('bob', b_sample)
+			# without a sample there is no estimate (hamming would return nan)
+			report.qber = float(self.estimation.Estimator().estimate(a_sample, b_sample)) if len(a_sample) else None
+			self.a_key, self.b_key = a_sampler.remaining(), b_sampler.remaining()
+			report.final_length = len(self.a_key)
+
+		self._channel_report(report)
+		return report
+
+	def simulate_attack(self, eavesdropper):
+		# everything is drawn and sifted on numpy arrays: the Sifter works one bit at a time
+		generator = np.random.default_rng(getrandbits(64))
+		a_bits = generator.integers(0, 2, self.pulses, dtype=np.uint8)
+		a_bases = generator.choice(self.bases, self.pulses)
+		b_bases = generator.choice(self.bases, self.pulses)
+		b_bits = bits_to_array(eavesdropper.simulate(array_to_bits(a_bits), a_bases, b_bases))
+
+		sifted = a_bases == b_bases
+		return float(np.mean(a_bits[sifted] != b_bits[sifted])) if sifted.any() else 0.0, None
+
+class SSPSession(BB84Session):
+	"""Session running the Six State protocol"""
+
+	name = 'ssp'
+	bases = (0,1,2)
+	encoding, decoding, sifting, estimation = ssp.encoding, ssp.decoding, ssp.sifting, ssp.estimation
+	eavesdropping = ssp.eavesdropping
+
+class E91Session(Session):
+	"""Session running the E91 protocol
+
+	The CHSH parameter is estimated on the pairs measured in the bases of its terms, whose outcomes
+	Bob discloses (the key pairs are never among them), while the QBER is measured on the sifted keys,
+	which are expected to be complementary.
+
+	Parameters
+	----------
+	pulses : int
+	       number of pulses sent by the source
+	a_angles, b_angles : tuple[float]
+	                   directions (angles from the Z axis, in the ZX plane) of Alice's and Bob's bases;
+	                   the CHSH terms are derived from them (see e91.estimation.chsh_terms)
+	key_pairs : tuple[tuple[int, int]]
+	          pairs of bases making the key; the parallel ones if None (see e91.parameters.parallel_pairs)
+	terms : tuple[tuple[int, int, int]]
+	      terms of the CHSH parameter; derived from the angles if None (e.g. e91.optimization gives them)
+	options : dict
+	        further arguments of Session
+
+	"""
+
+	name = 'e91'
+	eavesdropping = e91.eavesdropping
+
+	def __init__(self, pulses, a_angles=e91.parameters.A_ANGLES, b_angles=e91.parameters.B_ANGLES, key_pairs=None, terms=None,
+				 **options):
+		super().__init__(pulses, **options)
+		self.a_angles = tuple(a_angles)
+		self.b_angles = tuple(b_angles)
+		self.key_pairs = tuple(key_pairs) if key_pairs is not None else e91.parameters.parallel_pairs(self.a_angles, self.b_angles)
+		self.terms = tuple(terms) if terms is not None else e91.estimation.chsh_terms(self.a_angles, self.b_angles, self.key_pairs)
+
+	def run(self):
+		report = Report(self.name, self.pulses)
+
+		with report.stage('encode', self.pulses):
+			states = None if self.analytic else e91.encoding.Encoder().encode(self.pulses)
+
+		states = self._eavesdrop(report, states)
+
+		with report.stage('decode'):
+			a_bases = choices((0,1,2), k=self.pulses)
+			b_bases = choices((0,1,2), k=self.pulses)
+			if self.analytic:
+				a_raw_key, b_raw_key = self._simulate(report, a_bases, b_bases)
+			else:
+				mask = None
+				if self.lazy:
+					# pairs measured in bases used neither for the key nor for the CHSH parameter are skipped
+					mask = e91.sifting.Sifter(a_bases, b_bases, self.key_pairs).mask() | self._estimator().mask(a_bases, b_bases)
+				a_raw_key, b_raw_key = self._decode(report, e91.decoding.Decoder(self.a_angles, self.b_angles), a_bases, b_bases, states, mask=mask)
+			if self.noise:
+				b_raw_key = add_noise(b_raw_key, self.noise)
+
+		with report.stage('sift', self.pulses):
+			a_sifted_key, b_sifted_key = self._sift(partial(e91.sifting.Sifter, key_pairs=self.key_pairs), 3, a_bases, b_bases, a_raw_key, b_raw_key)
+		report.sifted_length = len(a_sifted_key)
+		report.final_length = len(a_sifted_key)
+
+		with report.stage('estimate', self.pulses):
+			# Bob discloses only the outcomes used by the estimator, so that Alice can estimate the parameter
+			estimator = self._estimator()
+			estimation_mask = estimator.mask(a_bases, b_bases)
+			a_estimation_key, b_estimation_key = extract_sample(a_raw_key, estimation_mask), extract_sample(b_raw_key, estimation_mask)
+			self._announce('bob', b_estimation_key)
+			report.chsh = estimator.estimate(a_estimation_key, b_estimation_key,
+											 [basis for basis, used in zip(a_bases, estimation_mask) if used],
+											 [basis for basis, used in zip(b_bases, estimation_mask) if used])
+			report.qber = float(hamming(a_sifted_key, ~b_sifted_key)) if len(a_sifted_key) else None
+			# Bob inverts his bits, since the outcomes of |PSI-> are anti-correlated
+			self.a_key, self.b_key = a_sifted_key, ~b_sifted_key if len(b_sifted_key) else b_sifted_key
+
+		self._channel_report(report)
+		return report
+
+	def simulate_attack(self, eavesdropper):
+		# everything is drawn, sifted and estimated on numpy arrays: Sifter and Estimator work one bit at a time
+		generator = np.random.default_rng(getrandbits(64))
+		a_bases = generator.integers(0, 3, self.pulses)
+		b_bases = generator.integers(0, 3, self.pulses)
+		a_raw_key, b_raw_key = eavesdropper.simulate(a_bases, b_bases)
+		a_bits, b_bits = bits_to_array(a_raw_key), bits_to_array(b_raw_key)
+
+		sifted = np.zeros(self.pulses, dtype=bool)
+		for a_basis, b_basis in self.key_pairs:
+			sifted |= (a_bases == a_basis) & (b_bases == b_basis)
+		# the sifted keys should be complementary, so equal bits are errors
+		qber = float(np.mean(a_bits[sifted] == b_bits[sifted])) if sifted.any() else 0.0
+		return qber, self._estimator().estimate_arrays(a_bits, b_bits, a_bases, b_bases)
+
+	def _estimator(self):
+		return e91.estimation.Estimator(self.a_angles, self.b_angles, terms=self.terms)
+
+	def _honest_eavesdropper(self):
+		return e91.eavesdropping.Eavesdropper(0, a_angles=self.a_angles, b_angles=self.b_angles,
+											  key_pairs=self.key_pairs, terms=self.terms)
+
+SESSIONS = { session.name : session for session in (BB84Session, SSPSession, E91Session) }
+
+def _decode_chunk(job):
+	# module level function, so that it can be sent to the worker processes
+	decoder, columns = job
+	return decoder.decode(*columns)
+
+def _chunk_bounds(length, chunks):
+	# contiguous (start, stop) slices of nearly equal size covering range(length)
+	size, extra = divmod(length, chunks)
+	bounds = []
+	start = 0
+	for i in range(chunks):
+		stop = start + size + (1 if i < extra else 0)
+		if stop > start:
+			bounds.append((start, stop))
+		start = stop
+	return bounds
+
+def _rate(pulses, seconds):
+	return pulses / seconds if seconds > 0 else float('inf')
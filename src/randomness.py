@@ -0,0 +1,406 @@
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from math import erfc, sqrt, log, lcm
+from scipy.special import gammaincc
+from bitstring import Bits
+
+# probabilities of the classes of the longest run of ones test (NIST SP 800-22, section 2.4),
+# for each supported block size: (smallest class, largest class, probabilities)
+LONGEST_RUN_CLASSES = {
+	8 : (1, 4, [0.2148, 0.3672, 0.2305, 0.1875]),
+	128 : (4, 9, [0.1174, 0.2430, 0.2493, 0.1752, 0.1027, 0.1124]),
+	10000 : (10, 16, [0.0882, 0.2092, 0.2483, 0.1933, 0.1208, 0.0675, 0.0727]),
+}
+
+# names of the p-values returned by RandomnessSuite.finalize
+TESTS = ('frequency', 'block_frequency', 'runs', 'longest_run', 'serial_1', 'serial_2', 'approximate_entropy', 'spectral')
+
+class PartialStatistics:
+	"""Statistics of a contiguous piece of a bit sequence.
+
+	Partial statistics of consecutive pieces are combined with RandomnessSuite.merge,
+	so a sequence can be tested one chunk at a time, and the chunks can be processed in parallel.
+
+	Attributes
+	----------
+	length : int
+	       number of bits
+	ones : int
+	     number of ones
+	transitions : int
+	            number of adjacent unequal bits
+	block_deviation : float
+	                sum over the blocks of (proportion of ones - 1/2)^2
+	blocks : int
+	       number of blocks of the block frequency test
+	longest_runs : numpy.ndarray
+	             number of blocks in each class of the longest run test
+	patterns : dict(int, numpy.ndarray)
+	         counts of the overlapping patterns of each length
+	spectral_below : int
+	               number of DFT peaks below the threshold
+	spectral_expected : float
+	                  expected number of peaks below the threshold
+	spectral_variance : float
+	                  variance of the number of peaks below the threshold
+	head : numpy.ndarray
+	     first bits (needed to count the patterns across chunks)
+	tail : numpy.ndarray
+	     last bits
+
+	"""
+
+	def __init__(self, suite):
+		self.length = 0
+		self.ones = 0
+		self.transitions = 0
+		self.block_deviation = 0.0
+		self.blocks = 0
+		self.longest_runs = np.zeros(len(LONGEST_RUN_CLASSES[suite.run_block_size][2]), dtype=np.int64)
+		self.patterns = { k : np.zeros(1 << k, dtype=np.int64) for k in suite.pattern_lengths() }
+		self.spectral_below = 0
+		self.spectral_expected = 0.0
+		self.spectral_variance = 0.0
+		self.head = np.zeros(0, dtype=np.uint8)
+		self.tail = np.zeros(0, dtype=np.uint8)
+
+class RandomnessSuite:
+	"""Streaming version of the NIST SP 800-22 statistical tests.
+
+	The supported tests are frequency, block frequency, runs, longest run of ones in a block,
+	serial, approximate entropy and spectral (DFT). Every test is reduced to statistics that can be
+	computed on a chunk of the sequence and merged, so the whole sequence is never held in memory.
+
+	Block based tests need the chunks to start at block boundaries: every chunk but the last one
+	must contain a multiple of `alignment` bits. Incomplete blocks at the end of the sequence are discarded.
+	The spectral test is computed on blocks of spectral_block_size bits, and the counts of
+	peaks below the threshold are summed over the blocks (the original test uses a single DFT of the whole sequence).
+
+	Parameters
+	----------
+	block_size : int
+	           block size of the block frequency test
+	run_block_size : int
+	               block size of the longest run test (8, 128 or 10000)
+	serial_length : int
+	              pattern length of the serial test
+	entropy_length : int
+	               pattern length of the approximate entropy test
+	spectral_block_size : int
+	                    number of bits in each DFT of the spectral test
+
+	"""
+
+	def __init__(self, block_size=128, run_block_size=10000, serial_length=16, entropy_length=10, spectral_block_size=160000):
+		if run_block_size not in LONGEST_RUN_CLASSES:
+			raise ValueError(f'run_block_size must be one of {sorted(LONGEST_RUN_CLASSES)}')
+		self.block_size = block_size
+		self.run_block_size = run_block_size
+		self.serial_length = serial_length
+		self.entropy_length = entropy_length
+		self.spectral_block_size = spectral_block_size
+		self.alignment = lcm(8, block_size, run_block_size, spectral_block_size)
+
+	def pattern_lengths(self):
+		"""Lengths of the overlapping patterns counted for the serial and approximate entropy tests"""
+		m, e = self.serial_length, self.entropy_length
+		return sorted({k for k in (m, m - 1, m - 2, e, e + 1) if k > 0})
+
+	def partial(self, chunk, length=None):
+		"""Computes the statistics of a chunk
+
+		Parameters
+		----------
+		chunk : bytes or numpy.ndarray
+		      packed bits (8 per byte, most significant first)
+		length : int
+		       number of valid bits in the chunk; all of them if None
+
+		Returns
+		-------
+		statistics : PartialStatistics
+
+		"""
+
+		bits = np.unpackbits(np.frombuffer(chunk, dtype=np.uint8))
+		if length is not None:
+			bits = bits[:length]
+
+		statistics = PartialStatistics(self)
+		statistics.length = len(bits)
+		if len(bits) == 0:
+			return statistics
+
+		statistics.ones = int(np.count_nonzero(bits))
+		statistics.transitions = int(np.count_nonzero(bits[1:] != bits[:-1]))
+		statistics.head = bits[:self._edge()].copy()
+		statistics.tail = bits[len(bits) - self._edge():].copy()
+
+		blocks = _blocks(bits, self.block_size)
+		statistics.blocks = len(blocks)
+		statistics.block_deviation = float(np.sum((blocks.mean(axis=1) - 0.5) ** 2)) if len(blocks) else 0.0
+
+		smallest, largest, probabilities = LONGEST_RUN_CLASSES[self.run_block_size]
+		longest = _longest_runs(_blocks(bits, self.run_block_size))
+		statistics.longest_runs = np.bincount(np.clip(longest, smallest, largest) - smallest, minlength=len(probabilities))
+
+		# the longest patterns are counted on the packed bits, the shorter ones are obtained dropping
+		# their last bits, and adding the patterns that start too close to the end of the chunk
+		lengths = sorted(statistics.patterns, reverse=True)
+		longest_counts = _count_packed_patterns(np.frombuffer(chunk, dtype=np.uint8), len(bits), lengths[0])
+		for k in lengths:
+			counts = longest_counts.reshape(1 << k, -1).sum(axis=1)
+			statistics.patterns[k] = counts + _count_patterns(bits, k, max(len(bits) - lengths[0] + 1, 0), len(bits) - k + 1)
+
+		blocks = _blocks(bits, self.spectral_block_size)
+		if len(blocks):
+			n = self.spectral_block_size
+			moduli = np.abs(np.fft.rfft(2.0 * blocks - 1, axis=1)[:, :n // 2])
+			statistics.spectral_below = int(np.count_nonzero(moduli < sqrt(log(1 / 0.05) * n)))
+			statistics.spectral_expected = len(blocks) * 0.95 * n / 2
+			statistics.spectral_variance = len(blocks) * n * 0.95 * 0.05 / 4
+
+		return statistics
+
+	def merge(self, first, second):
+		"""Combines the statistics of two consecutive pieces of the sequence
+
+		Returns
+		-------
+		statistics : PartialStatistics
+
+		"""
+
+		if first.length == 0:
+			return second
+		if second.length == 0:
+			return first
+
+		merged = PartialStatistics(self)
+		merged.length = first.length + second.length
+		merged.ones = first.ones + second.ones
+		merged.transitions = first.transitions + second.transitions + int(first.tail[-1] != second.head[0])
+		merged.block_deviation = first.block_deviation + second.block_deviation
+		merged.blocks = first.blocks + second.blocks
+		merged.longest_runs = first.longest_runs + second.longest_runs
+		merged.spectral_below = first.spectral_below + second.spectral_below
+		merged.spectral_expected = first.spectral_expected + second.spectral_expected
+		merged.spectral_variance = first.spectral_variance + second.spectral_variance
+
+		for k in merged.patterns:
+			merged.patterns[k] = first.patterns[k] + second.patterns[k] + _crossing_patterns(first.tail, second.head, k)
+
+		merged.head = np.concatenate((first.head, second.head))[:self._edge()]
+		tail = np.concatenate((first.tail, second.tail))
+		merged.tail = tail[len(tail) - self._edge():]
+		return merged
+
+	def finalize(self, statistics):
+		"""Computes the p-values of the tests
+
+		Parameters
+		----------
+		statistics : PartialStatistics
+		           statistics of the whole sequence
+
+		Returns
+		-------
+		p_values : dict(str, float)
+
+		"""
+
+		n = statistics.length
+		if n == 0:
+			# no test is applicable to an empty sequence
+			return dict.fromkeys(TESTS, float('nan'))
+		p_values = {}
+
+		p_values['frequency'] = erfc(abs(2 * statistics.ones - n) / sqrt(2 * n))
+
+		blocks = statistics.blocks
+		p_values['block_frequency'] = float(gammaincc(blocks / 2, 2 * self.block_size * statistics.block_deviation)) if blocks else float('nan')
+
+		pi = statistics.ones / n
+		if abs(pi - 0.5) >= 2 / sqrt(n):
+			# the frequency test prerequisite fails, so the runs test is not applicable
+			p_values['runs'] = 0.0
+		else:
+			runs = statistics.transitions + 1
+			p_values['runs'] = erfc(abs(runs - 2 * n * pi * (1 - pi)) / (2 * sqrt(2 * n) * pi * (1 - pi)))
+
+		probabilities = np.array(LONGEST_RUN_CLASSES[self.run_block_size][2])
+		total = statistics.longest_runs.sum()
+		if total:
+			chi_squared = np.sum((statistics.longest_runs - total * probabilities) ** 2 / (total * probabilities))
+			p_values['longest_run'] = float(gammaincc((len(probabilities) - 1) / 2, chi_squared / 2))
+		else:
+			p_values['longest_run'] = float('nan')
+
+		# the sequence is treated as cyclic, as in the NIST tests
+		patterns = { k : counts + _crossing_patterns(statistics.tail, statistics.head, k)
+					 for k, counts in statistics.patterns.items() }
+
+		m = self.serial_length
+		psi = lambda k: (1 << k) / n * float(np.sum(patterns[k].astype(np.float64) ** 2)) - n if k > 0 else 0.0
+		delta = psi(m) - psi(m - 1)
+		delta_squared = psi(m) - 2 * psi(m - 1) + psi(m - 2)
+		p_values['serial_1'] = float(gammaincc(2 ** (m - 2), delta / 2))
+		p_values['serial_2'] = float(gammaincc(2 ** (m - 3), delta_squared / 2))
+
+		e = self.entropy_length
+		phi = lambda k: float(np.sum(_xlogx(patterns[k] / n)))
+		chi_squared = 2 * n * (log(2) - (phi(e) - phi(e + 1)))
+		p_values['approximate_entropy'] = float(gammaincc(2 ** (e - 1), chi_squared / 2))
+
+		if statistics.spectral_variance:
+			d = (statistics.spectral_below - statistics.spectral_expected) / sqrt(statistics.spectral_variance)
+			p_values['spectral'] = erfc(abs(d) / sqrt(2))
+		else:
+			p_values['spectral'] = float('nan')
+
+		return p_values
+
+	def test(self, key):
+		"""Runs the tests on a key held in memory
+
+		Parameters
+		----------
+		key : bitstring.Bits
+
+		Returns
+		-------
+		p_values : dict(str, float)
+
+		"""
+
+		key = Bits(key)
+		return self.finalize(self.partial(key.tobytes(), len(key)))
+
+	def test_stream(self, chunks, workers=1):
+		"""Runs the tests on a sequence given one chunk at a time
+
+		Chunks are processed by `workers` processes, with a bounded number of chunks in flight,
+		and their statistics are merged in order. ValueError is raised if a chunk that is not a multiple
+		of `alignment` bits is followed by another one, since the blocks would straddle the chunks.
+
+		Parameters
+		----------
+		chunks : iterable of bytes
+		       packed bits; every chunk but the last must hold a multiple of `alignment` bits
+		workers : int
+		        number of processes
+
+		Returns
+		-------
+		p_values : dict(str, float)
+
+		"""
+
+		chunks = self._aligned(chunks)
+		total = PartialStatistics(self)
+		if workers <= 1:
+			for chunk in chunks:
+				total = self.merge(total, self.partial(chunk))
+			return self.finalize(total)
+
+		with ProcessPoolExecutor(max_workers=workers) as executor:
+			pending = deque()
+			for chunk in chunks:
+				pending.append(executor.submit(self.partial, chunk))
+				if len(pending) >= 2 * workers:
+					total = self.merge(total, pending.popleft().result())
+			while pending:
+				total = self.merge(total, pending.popleft().result())
+		return self.finalize(total)
+
+	def test_file(self, path, workers=1, chunk_bits=None):
+		"""Runs the tests on the bits stored in a file, read one chunk at a time
+
+		Parameters
+		----------
+		path : str
+		workers : int
+		        number of processes
+		chunk_bits : int
+		           bits read at a time, rounded up to a multiple of `alignment`; 64 * alignment if None
+
+		Returns
+		-------
+		p_values : dict(str, float)
+
+		"""
+
+		chunk_bits = chunk_bits or 64 * self.alignment
+		chunk_bytes = -(-chunk_bits // self.alignment) * self.alignment // 8
+		with open(path, 'rb') as file:
+			return self.test_stream(iter(lambda: file.read(chunk_bytes), b''), workers)
+
+	def _aligned(self, chunks):
+		# yields the chunks, checking that only the last one may end inside a block
+		misaligned = None
+		for chunk in chunks:
+			if misaligned is not None:
+				raise ValueError(f'a chunk of {misaligned} bits is not the last one: '
+								 f'every chunk but the last must hold a multiple of {self.alignment} bits')
+			if 8 * len(chunk) % self.alignment:
+				misaligned = 8 * len(chunk)
+			yield chunk
+
+	def _edge(self):
+		# bits kept at both ends of a chunk: enough to complete the longest pattern, and at least one for the runs test
+		return max(max(self.pattern_lengths()) - 1, 1)
+
+def _blocks(bits, size):
+	# complete blocks of `size` bits, one per row
+	count = len(bits) // size
+	return bits[:count * size].reshape(count, size)
+
+def _longest_runs(blocks):
+	# each row is padded with zeros, so that the runs of ones are the gaps between consecutive zeros
+	if len(blocks) == 0:
+		return np.zeros(0, dtype=np.int64)
+	padded = np.zeros((len(blocks), blocks.shape[1] + 2), dtype=np.uint8)
+	padded[:, 1:-1] = blocks
+	zeros = np.flatnonzero(padded.ravel() == 0)
+	longest = np.zeros(len(blocks), dtype=np.int64)
+	np.maximum.at(longest, zeros[:-1] // padded.shape[1], np.diff(zeros) - 1)
+	return longest
+
+def _count_patterns(bits, k, start, stop):
+	# counts the k bits patterns starting at positions [start, stop) of bits
+	counts = np.zeros(1 << k, dtype=np.int64)
+	if stop <= start:
+		return counts
+	values = np.zeros(stop - start, dtype=np.int64)
+	for j in range(k):
+		values = (values << 1) | bits[start + j:stop + j]
+	return counts + np.bincount(values, minlength=1 << k)
+
+def _count_packed_patterns(packed, length, k):
+	# counts the k bits patterns (k <= 57) starting at positions [0, length - k] of the packed bits:
+	# the 64 bits words starting at each byte are built once, and the patterns starting at
+	# bit r of each byte are extracted with a shift, for r in 0..7
+	counts = np.zeros(1 << k, dtype=np.int64)
+	if length < k:
+		return counts
+	padded = np.concatenate((packed[:(length + 7) // 8], np.zeros(8, dtype=np.uint8))).astype(np.uint64)
+	words = np.zeros(len(padded) - 7, dtype=np.uint64)
+	for j in range(8):
+		words |= padded[j:j + len(words)] << np.uint64(56 - 8 * j)
+	mask = np.uint64((1 << k) - 1)
+	for r in range(8):
+		last = (length - k - r) // 8
+		if last < 0:
+			continue
+		counts += np.bincount(((words[:last + 1] >> np.uint64(64 - k - r)) & mask).astype(np.int64), minlength=1 << k)
+	return counts
+
+def _crossing_patterns(tail, head, k):
+	# counts the k bits patterns starting in tail and ending in head
+	bits = np.concatenate((tail, head))
+	return _count_patterns(bits, k, max(len(tail) - k + 1, 0), min(len(tail), len(bits) - k + 1))
+
+def _xlogx(x):
+	x = x[x > 0]
+	return x * np.log(x)
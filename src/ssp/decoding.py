@@ -8,11 +8,13 @@ class Decoder:
 
 	"""
 
-	def decode(self,b_bases, quantum_states):
+	def decode(self,b_bases, quantum_states, mask=None):
 		"""Generates Bob's raw key. 
 
 		The i-th bit of the key is created measuring the qubit in the basis
-		specified by the i-th element of a random bit string b_bases
+		specified by the i-th element of a random bit string b_bases.
+		If a mask is given, only the qubits whose mask bit is 1 are measured (e.g. the ones that
+		survive sifting): the other bits of the key are absent, and set to 0.
 
 		Parameters
 		----------
@@ -20,6 +22,8 @@ class Decoder:
 		 	    bases in which Bob performs his measures
 		quantum_states: list[qiskit.QuantumCircuit]
 		              list of states prepared by Alice
+		mask : bitstring.Bits
+		     positions to measure, all of them if None
 
 		Returns
 		-------
@@ -34,6 +38,9 @@ class Decoder:
 
 		# generates one bit at time
 		for i in range(len(b_bases)):
+			if mask is not None and not mask[i]:
+				b_raw_key.append(0)
+				continue
 			circuit = self._make_circuit(b_bases[i], quantum_states[i])
 			bit = simulator.run(transpile(circuit, simulator), shots=1, memory=True).result().get_memory()[0]
 			# bit is the string '0' or '1'
@@ -0,0 +1,14 @@
+from bb84.eavesdropping import Eavesdropper as BB84Eavesdropper
+from ssp.encoding import EncodingCircuit
+from ssp.decoding import Decoder
+
+class Eavesdropper(BB84Eavesdropper):
+	"""Intercept-resend attack on Six State protocol.
+
+	Same as the BB84 attack, with Eve choosing among the Z, X and Y bases (weights has three elements).
+
+	"""
+
+	bases = (0,1,2)
+	_encoding_circuit = EncodingCircuit
+	_decoder = Decoder
@@ -1,6 +1,8 @@
+import numpy as np
 from bitstring import Bits
-from random import choices, sample
+from random import choices, getrandbits
 from math import floor, ceil
+from statistics import NormalDist
 
 def errors_bitvector(bitvector_a, bitvector_b):
 	return bitvector_a ^ bitvector_b
@@ -16,19 +18,84 @@ def add_noise(bitvector, probability=0.2):
 	return bitvector ^ noise
 
 class Sampler:
-	def __init__(self, bitvector, sampling_bitvector=None):
+	"""Class to extract the sample used to estimate the error rate from a sifted key.
+
+	The sample is made of k positions drawn without replacement, in O(k) time, by a numpy generator
+	seeded from the random module (so random.seed makes it reproducible).
+	k is either a fixed fraction of the key, or, if width is given, the smallest sample such that the
+	confidence interval on the QBER has half width `width` at the given confidence level,
+	assuming an error rate expected_qber.
+
+	Parameters
+	----------
+	bitvector : bitstring.Bits
+	          sifted key
+	sampling_bitvector : bitstring.Bits
+	                   mask announced by the other party; if None, a new sample is drawn
+	fraction : float
+	         fraction of the key sacrificed for estimation
+	width : float
+	      target half width of the confidence interval on the QBER; overrides fraction
+	expected_qber : float
+	              error rate assumed to size the sample
+	confidence : float
+	           confidence level of the interval
+
+	Attributes
+	----------
+	sampling_bitvector : bitstring.Bits
+	                   mask with 1 at the sampled positions
+	sampling_indices : numpy.ndarray
+	                 sorted sampled positions
+
+	"""
+
+	def __init__(self, bitvector, sampling_bitvector=None, fraction=0.5, width=None, expected_qber=0.11, confidence=0.95):
 		self._bitvector = bitvector
 		self.sampling_bitvector = sampling_bitvector
 		if None == sampling_bitvector:
-			population = [1 for i in range(floor(len(bitvector) / 2))] \
-					   + [0 for i in range(ceil(len(bitvector) / 2))]
-			self.sampling_bitvector = Bits(sample(population, k=len(bitvector)))
+			k = sample_size(len(bitvector), fraction, width, expected_qber, confidence)
+			generator = np.random.default_rng(getrandbits(64))
+			self.sampling_indices = np.sort(generator.choice(len(bitvector), size=k, replace=False, shuffle=False))
+			self.sampling_bitvector = array_to_bits(_indices_to_mask(self.sampling_indices, len(bitvector)))
+		else:
+			self.sampling_indices = np.flatnonzero(bits_to_array(sampling_bitvector))
 
 	def sample(self):
-		return extract_sample(self._bitvector, self.sampling_bitvector)
+		return array_to_bits(bits_to_array(self._bitvector)[self.sampling_indices])
 
 	def remaining(self):
-		return extract_sample(self._bitvector, flip_bitvector(self.sampling_bitvector))
+		return array_to_bits(np.delete(bits_to_array(self._bitvector), self.sampling_indices))
+
+def sample_size(length, fraction=0.5, width=None, expected_qber=0.11, confidence=0.95):
+	"""Number of bits to sample from a key of the given length
+
+	If width is None, floor(length * fraction) is returned; otherwise the normal approximation
+	k = z^2 * q * (1 - q) / width^2 is used, with q = expected_qber and z the quantile of the confidence level.
+
+	Returns
+	-------
+	k : int
+
+	"""
+	if width is None:
+		if not 0 < fraction < 1:
+			raise ValueError(f'sample fraction {fraction} is not in (0, 1)')
+		return min(length, floor(length * fraction))
+	if width <= 0:
+		raise ValueError(f'confidence interval half width {width} is not positive')
+	z = NormalDist().inv_cdf((1 + confidence) / 2)
+	return min(length, ceil(z * z * expected_qber * (1 - expected_qber) / (width * width)))
+
+def bits_to_array(bitvector):
+	"""Converts a bitvector to a numpy array with one uint8 (0 or 1) per bit"""
+	return np.unpackbits(np.frombuffer(Bits(bitvector).tobytes(), dtype=np.uint8))[:len(bitvector)]
 
-	
+def array_to_bits(array):
+	"""Inverse of bits_to_array"""
+	return Bits(np.packbits(np.asarray(array, dtype=np.uint8)).tobytes())[:len(array)]
 
+def _indices_to_mask(indices, length):
+	mask = np.zeros(length, dtype=np.uint8)
+	mask[indices] = 1
+	return mask
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from bitstring import Bits
+from authentication import PRIME, KeyPool, Authenticator, AuthenticationError, KeyExhaustedError
+
+def _random_bits(length, seed=0):
+	return Bits(np.random.default_rng(seed).integers(0, 2, length).tolist())
+
+def _horner_tag(key, message, hashes=4):
+	# pure python reference of Authenticator: hash keys first, then the one-time-pad of the tag, added modulo PRIME
+	points = [key[31 * i:31 * (i + 1)].uint % PRIME for i in range(hashes)]
+	pad = key[31 * hashes:62 * hashes]
+	padded = bytes(message) + bytes(-len(message) % 3)
+	coefficients = [int.from_bytes(padded[i:i + 3], 'big') for i in range(0, len(padded), 3)] + [len(message)]
+	words = []
+	for i, point in enumerate(points):
+		value = 0
+		for coefficient in coefficients:
+			value = (value * point + coefficient) % PRIME
+		words.append((value + pad[31 * i:31 * (i + 1)].uint) % PRIME)
+	return b''.join(word.to_bytes(4, 'big') for word in words)
+
+@pytest.mark.parametrize('length', [0, 1, 2, 3, 4, 100, 5000])
+def test_hash_matches_horner_reference(length):
+	key = _random_bits(1000, seed=length)
+	message = bytes(np.random.default_rng(length).integers(0, 256, length, dtype=np.uint8))
+	assert Authenticator(KeyPool(key)).tag(message) == _horner_tag(key, message)
+
+def test_cached_powers_give_the_same_tags():
+	key = _random_bits(2000)
+	authenticator = Authenticator(KeyPool(key))
+	# a long message extends the cached powers, the short one then reuses them
+	authenticator.tag(bytes(range(256)) * 20)
+	short = b'sifting'
+	assert authenticator.tag(short) == _horner_tag(key[:124] + key[248:], short)
+
+def test_verify_accepts_genuine_and_rejects_tampered_messages():
+	key = _random_bits(1000)
+	tagger, verifier = Authenticator(KeyPool(key)), Authenticator(KeyPool(key))
+	verifier.verify(b'bases', tagger.tag(b'bases'))
+	tag = tagger.tag(b'bases')
+	with pytest.raises(AuthenticationError):
+		verifier.verify(b'basex', tag)
+	with pytest.raises(AuthenticationError):
+		verifier.verify(b'bases', tagger.tag(b'bases')[:-1])
+
+def test_pad_is_added_modulo_prime():
+	# a pad of all ones is PRIME, which adds nothing modulo PRIME
+	key = _random_bits(124) + Bits(124 * [1])
+	tag = Authenticator(KeyPool(key)).tag(b'message')
+	reference = Authenticator(KeyPool(_random_bits(124) + Bits(124 * [0])))
+	assert tag == reference.tag(b'message')
+
+def test_key_exhaustion():
+	with pytest.raises(KeyExhaustedError):
+		Authenticator(KeyPool(_random_bits(200))).tag(b'message')
+	assert Authenticator.required_bits(1) == 248
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+from bitstring import Bits
+from channel import ClassicalChannel, encode_bases, decode_bases, encode_mask, decode_mask, encode_indices, decode_indices
+
+@pytest.mark.parametrize('alphabet', [2, 3])
+@pytest.mark.parametrize('length', [0, 1, 7, 1001])
+def test_bases_round_trip(alphabet, length):
+	bases = np.random.default_rng(alphabet).integers(0, alphabet, length).tolist()
+	assert decode_bases(encode_bases(bases, alphabet)) == bases
+
+@pytest.mark.parametrize('density', [0.0, 0.01, 2 / 9, 0.5, 0.99, 1.0])
+def test_mask_and_indices_round_trip(density):
+	mask = Bits((np.random.default_rng(1).random(997) < density).tolist())
+	assert decode_mask(encode_mask(mask)) == mask
+	assert decode_indices(encode_indices(mask)) == mask
+
+def test_indices_are_shorter_than_sparse_masks():
+	mask = Bits((np.random.default_rng(2).random(9000) < 2 / 9).tolist())
+	assert len(encode_indices(mask)) < len(encode_mask(mask))
+
+def test_channel_accounts_bytes_and_time():
+	channel = ClassicalChannel(latency=0.01, bandwidth=8000)
+	assert channel.send('alice', b'0123456789') == b'0123456789'
+	channel.send('bob', b'01234')
+	assert channel.messages == 2
+	assert channel.bytes_sent == { 'alice' : 10, 'bob' : 5 }
+	assert channel.total_bytes() == 15
+	assert channel.clock == pytest.approx(0.02 + 15 * 8 / 8000)
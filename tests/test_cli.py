@@ -0,0 +1,52 @@
+import json
+import pytest
+from qkd.cli import main
+
+def _run(*options):
+	return main(['run', '--pulses', '2000', '--seed', '1', '--analytic', *options])
+
+@pytest.mark.parametrize('protocol', ['bb84', 'ssp', 'e91'])
+def test_clean_session_exits_with_0(protocol):
+	assert _run('--protocol', protocol) == 0
+
+def test_qber_above_threshold_exits_with_1(capsys):
+	assert _run('--noise', '0.3') == 1
+	assert 'FAILED: qber' in capsys.readouterr().err
+
+def test_chsh_below_threshold_exits_with_1(capsys):
+	assert _run('--protocol', 'e91', '--min-chsh', '2.9') == 1
+	assert 'FAILED: |chsh|' in capsys.readouterr().err
+
+def test_session_without_qber_estimate_exits_with_1(capsys):
+	# a single pulse leaves no sifted bit to sample
+	assert main(['run', '--pulses', '1', '--seed', '1', '--analytic', '--sample-fraction', '0.01']) == 1
+	assert 'FAILED: no qber estimate' in capsys.readouterr().err
+
+def test_transcript_records_the_failures(tmp_path):
+	path = tmp_path / 'transcript.json'
+	assert _run('--noise', '0.3', '--out', str(path)) == 1
+	transcript = json.loads(path.read_text())
+	assert transcript['failures'] and transcript['qber'] > 0.11
+	assert transcript['arguments']['noise'] == 0.3
+
+def test_invalid_arguments_exit_with_2():
+	with pytest.raises(SystemExit) as exit:
+		main(['run', '--pulses', '0'])
+	assert exit.value.code == 2
+
+def test_randomness_of_an_empty_file_exits_with_1(tmp_path, capsys):
+	path = tmp_path / 'empty.bin'
+	path.write_bytes(b'')
+	assert main(['randomness', str(path)]) == 1
+	assert 'FAILED: no test is applicable' in capsys.readouterr().err
+
+@pytest.mark.parametrize('links, demands', [('A-B,BC', 'A-B:8'), ('A-B', 'A-B:8y'), ('A-B', 'A-B'), ('A-B', 'A-C:8'),
+											('A-B', 'A-B:999999'), ('A-B', 'A-A:8')])
+def test_invalid_network_exits_with_1(links, demands, capsys):
+	assert main(['network', '--links', links, '--demands', demands, '--pulses', '2000']) == 1
+	assert capsys.readouterr().err.startswith('FAILED: ')
+
+@pytest.mark.parametrize('angles', [('0.1,90,45', '0,-45,60'), ('0,0,0', '0,0,0')])
+def test_e91_angles_without_key_pairs_or_chsh_terms_exit_with_1(angles, capsys):
+	assert _run('--protocol', 'e91', '--a-angles', angles[0], '--b-angles', angles[1]) == 1
+	assert capsys.readouterr().err.startswith('FAILED: ')
@@ -0,0 +1,34 @@
+from math import pi, sqrt, radians
+import numpy as np
+import pytest
+from bitstring import Bits
+from e91.parameters import A_ANGLES, B_ANGLES, KEY_PAIRS, parallel_pairs
+from e91.estimation import Estimator, chsh_terms
+from e91.optimization import AngleOptimizer, NoiseModel, CHSH_TERMS
+
+def test_default_chsh_terms_and_key_pairs():
+	assert parallel_pairs(A_ANGLES, B_ANGLES) == KEY_PAIRS
+	assert chsh_terms() == ((0,1,1), (0,2,1), (1,2,1), (1,1,-1))
+	with pytest.raises(ValueError):
+		parallel_pairs((0.1, pi/2, pi/4), (0, -pi/4, pi/3))
+	with pytest.raises(ValueError):
+		chsh_terms((0, 0, 0), (0, 0, 0))
+
+def test_vectorized_estimate_matches_estimate():
+	generator = np.random.default_rng(3)
+	a_bits, b_bits = generator.integers(0, 2, 2000), generator.integers(0, 2, 2000)
+	a_bases, b_bases = generator.integers(0, 3, 2000), generator.integers(0, 3, 2000)
+	expected = Estimator().estimate(Bits(a_bits.tolist()), Bits(b_bits.tolist()), a_bases.tolist(), b_bases.tolist())
+	assert Estimator().estimate_arrays(a_bits, b_bits, a_bases, b_bases) == pytest.approx(expected)
+
+@pytest.mark.parametrize('misalignment', [0, 6, 45, 60, 90, 135])
+def test_optimized_settings_reach_the_landscape_maximum(misalignment):
+	optimizer = AngleOptimizer(NoiseModel(0.95, radians(misalignment)))
+	settings = optimizer.optimize()
+	landscape = np.abs(optimizer.chsh_landscape()[0]).max()
+	assert settings['terms'] == CHSH_TERMS
+	assert abs(settings['chsh']) == pytest.approx(landscape)
+	# evaluating the returned structure again gives the same parameter
+	structure = { key : settings[key] for key in ('a_angles', 'b_angles', 'key_pairs', 'terms') }
+	assert abs(optimizer.evaluate(**structure)['chsh']) == pytest.approx(landscape)
+	assert abs(settings['chsh']) == pytest.approx(0.95 * 2 * sqrt(2), abs=1e-3)
@@ -0,0 +1,57 @@
+import random
+import pytest
+from qkd.network import Network
+
+def _line(nodes, **options):
+	# links between consecutive nodes, with the vectorized simulation of the sessions
+	network = Network()
+	for a_node, b_node in zip(nodes, nodes[1:]):
+		network.add_link(a_node, b_node, pulses=4000, capacity=4096, analytic=True, **options)
+	return network
+
+def test_path_is_the_shortest_one():
+	network = _line('ABCD')
+	network.add_link('A', 'E', analytic=True)
+	network.add_link('E', 'D', analytic=True)
+	assert network.path('A', 'D') == ['A', 'E', 'D']
+	assert network.path('D', 'B') == ['D', 'C', 'B']
+	with pytest.raises(ValueError):
+		network.path('A', 'Z')
+
+def test_relay_over_three_hops_without_noise_has_no_errors():
+	random.seed(4)
+	network = _line('ABCD', noise=0.0)
+	network.add_demand('A', 'D', 512, 3)
+	result = network.run()[('A', 'D')]
+	assert result['hops'] == 3
+	assert result['delivered_bits'] == 1536
+	assert result['error_rate'] == 0.0
+	# every trusted node forwarded each key once
+	assert [network.links[frozenset(pair)].channel.messages for pair in ('AB', 'BC', 'CD')] == [0, 3, 3]
+
+def test_noisy_links_give_errors():
+	random.seed(4)
+	network = _line('ABC', noise=0.05)
+	network.add_demand('A', 'C', 512, 2)
+	assert network.run()[('A', 'C')]['error_rate'] > 0
+
+def test_demands_between_the_same_nodes_are_reported_together():
+	random.seed(4)
+	network = _line('AB')
+	network.add_demand('A', 'B', 256, 2)
+	network.add_demand('A', 'B', 128, 3)
+	network.add_demand('B', 'A', 64)
+	results = network.run()
+	assert results[('A', 'B')]['delivered_bits'] == 896
+	assert results[('B', 'A')]['delivered_bits'] == 64
+
+@pytest.mark.parametrize('demand', [('A', 'A', 8, 1), ('A', 'B', 0, 1), ('A', 'B', 8, 0)])
+def test_invalid_demands(demand):
+	with pytest.raises(ValueError):
+		_line('AB').add_demand(*demand)
+
+def test_demands_larger_than_the_buffers_fail():
+	network = _line('ABC')
+	network.add_demand('A', 'C', 5000)
+	with pytest.raises(ValueError):
+		network.run()
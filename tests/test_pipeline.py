@@ -0,0 +1,75 @@
+import os
+import random
+import subprocess
+import sys
+import pytest
+from qiskit_aer import AerSimulator
+import bb84.decoding, ssp.decoding, e91.decoding
+from qkd.pipeline import SESSIONS, Session
+
+# the circuits go through qiskit methods deprecated since the version the code was written for
+pytestmark = pytest.mark.filterwarnings('ignore::DeprecationWarning', 'ignore::PendingDeprecationWarning')
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+class _SeededAer:
+	# with a fixed seed the outcome of a circuit only depends on the circuit,
+	# so that measuring a subset of the pulses gives the same bits on that subset
+	@staticmethod
+	def get_backend(name):
+		return AerSimulator(seed_simulator=11)
+
+@pytest.fixture
+def decoding_masks(monkeypatch):
+	for module in (bb84.decoding, ssp.decoding, e91.decoding):
+		monkeypatch.setattr(module, 'Aer', _SeededAer)
+	masks = []
+	decode = Session._decode
+	def recording_decode(self, report, decoder, *columns, mask=None):
+		masks.append(mask)
+		return decode(self, report, decoder, *columns, mask=mask)
+	monkeypatch.setattr(Session, '_decode', recording_decode)
+	return masks
+
+def _run(protocol, lazy, seed=5):
+	random.seed(seed)
+	session = SESSIONS[protocol](120, lazy=lazy)
+	return session, session.run()
+
+@pytest.mark.parametrize('protocol', ['bb84', 'ssp', 'e91'])
+def test_lazy_decoding_matches_full_decoding(protocol, decoding_masks):
+	full_session, full = _run(protocol, lazy=False)
+	lazy_session, lazy = _run(protocol, lazy=True)
+	full_mask, lazy_mask = decoding_masks
+
+	assert full_mask is None
+	assert full.simulated_pulses == 120
+	assert lazy.simulated_pulses == lazy_mask.count(1) < 120
+	assert (lazy_session.a_key, lazy_session.b_key) == (full_session.a_key, full_session.b_key)
+	assert (lazy.sifted_length, lazy.qber, lazy.chsh) == (full.sifted_length, full.qber, full.chsh)
+	# the decode stage is accounted with the pulses actually simulated
+	assert dict((name, pulses) for name, pulses, seconds in lazy.stages)['decode'] == lazy_mask.count(1)
+
+@pytest.mark.parametrize('protocol, weights', [('bb84', None), ('bb84', [0.8, 0.2]), ('ssp', None), ('ssp', [0.5, 0.3, 0.2]),
+											   ('e91', None), ('e91', [0.7, 0.3])])
+@pytest.mark.parametrize('fraction', [0.0, 0.5, 1.0])
+def test_simulated_attack_matches_the_theory(protocol, weights, fraction):
+	random.seed(1)
+	session = SESSIONS[protocol](200000)
+	eavesdropper = session.eavesdropping.Eavesdropper(fraction, weights=weights)
+	qber, chsh = session.simulate_attack(eavesdropper)
+	assert qber == pytest.approx(eavesdropper.expected_qber(), abs=0.01)
+	if protocol == 'e91':
+		assert chsh == pytest.approx(eavesdropper.expected_chsh(), abs=0.05)
+	else:
+		assert chsh is None
+
+@pytest.mark.parametrize('protocol', ['bb84', 'ssp', 'e91'])
+def test_workers_with_an_eavesdropper(protocol):
+	# the eavesdropper runs the simulator before the decoding workers are started, which deadlocked forked workers;
+	# the session runs in its own process, so that a regression fails on the timeout instead of hanging the tests
+	command = [sys.executable, '-m', 'qkd', 'run', '--protocol', protocol, '--pulses', '40', '--workers', '2',
+			   '--eve-fraction', '1', '--seed', '2', '--max-qber', '1', '--min-chsh', '0']
+	completed = subprocess.run(command, cwd=SRC, capture_output=True, text=True, timeout=120)
+	assert completed.returncode == 0, completed.stderr
+	assert 'eavesdrop' in completed.stdout and 'simulated     : 40' in completed.stdout
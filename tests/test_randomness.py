@@ -0,0 +1,60 @@
+from math import isnan
+import numpy as np
+import pytest
+from bitstring import Bits
+from randomness import RandomnessSuite, TESTS
+
+# 100 bits used by the worked examples of NIST SP 800-22 (sections 2.1.8, 2.2.8, 2.3.8, 2.12.8)
+NIST_EPSILON = '1100100100001111110110101010001000100001011010001100001000110100110001001100011001100010100010111000'
+# 128 bits of the worked example of the longest run of ones (section 2.4.8)
+NIST_LONGEST_RUN = '11001100000101010110110001001100111000000000001001001101010100010001001111010110100000001101011111001100111001101101100010110010'
+
+def _suite():
+	return RandomnessSuite(block_size=16, run_block_size=8, serial_length=5, entropy_length=3, spectral_block_size=64)
+
+def _random_bits(length, seed=0):
+	return Bits(np.random.default_rng(seed).integers(0, 2, length).tolist())
+
+def test_nist_worked_examples():
+	p_values = RandomnessSuite(block_size=10, run_block_size=8, serial_length=3, entropy_length=2,
+							   spectral_block_size=100).test(Bits(bin=NIST_EPSILON))
+	assert p_values['frequency'] == pytest.approx(0.109599, abs=1e-6)
+	assert p_values['block_frequency'] == pytest.approx(0.706438, abs=1e-6)
+	assert p_values['runs'] == pytest.approx(0.500798, abs=1e-6)
+	assert p_values['approximate_entropy'] == pytest.approx(0.235301, abs=1e-6)
+
+	serial = RandomnessSuite(block_size=10, run_block_size=8, serial_length=3, entropy_length=2,
+							 spectral_block_size=10).test(Bits(bin='0011011101'))
+	assert serial['serial_1'] == pytest.approx(0.808792, abs=1e-6)
+	assert serial['serial_2'] == pytest.approx(0.670320, abs=1e-6)
+
+	p_values = RandomnessSuite(block_size=8, run_block_size=8, serial_length=3, entropy_length=2,
+							   spectral_block_size=128).test(Bits(bin=NIST_LONGEST_RUN))
+	# NIST prints 0.180609, while its chi squared 4.882605 gives 0.180598
+	assert p_values['longest_run'] == pytest.approx(0.180609, abs=1e-4)
+
+def test_streamed_and_in_memory_p_values_agree():
+	suite = _suite()
+	key = _random_bits(64 * 37 + 16)
+	data = key.tobytes()
+	# chunks of different sizes, all aligned but the last one, which ends inside a block
+	step = suite.alignment // 8
+	bounds = [0, step, 4 * step, 5 * step, 20 * step, len(data)]
+	chunks = [data[start:stop] for start, stop in zip(bounds, bounds[1:])]
+	assert suite.test_stream(chunks) == pytest.approx(suite.test(key), rel=1e-9)
+
+def test_file_is_tested_by_workers(tmp_path):
+	suite = _suite()
+	key = _random_bits(64 * 50)
+	path = tmp_path / 'key.bin'
+	path.write_bytes(key.tobytes())
+	assert suite.test_file(str(path), workers=2, chunk_bits=suite.alignment * 3) == pytest.approx(suite.test(key), rel=1e-9)
+
+def test_misaligned_and_empty_streams():
+	suite = _suite()
+	data = _random_bits(64 * 10).tobytes()
+	with pytest.raises(ValueError):
+		suite.test_stream([data[:3], data[3:]])
+	p_values = suite.test_stream([])
+	assert set(p_values) == set(TESTS)
+	assert all(isnan(p_value) for p_value in p_values.values())
@@ -0,0 +1,32 @@
+import random
+import numpy as np
+import pytest
+from bitstring import Bits
+from utils import Sampler, sample_size
+
+def test_sampler_is_reproducible_and_shared():
+	key = Bits(np.random.default_rng(0).integers(0, 2, 1000).tolist())
+	random.seed(7)
+	first = Sampler(key, fraction=0.3)
+	random.seed(7)
+	second = Sampler(key, fraction=0.3)
+	assert np.array_equal(first.sampling_indices, second.sampling_indices)
+	assert len(first.sampling_indices) == sample_size(len(key), 0.3) == 300
+
+	# the other party rebuilds the same sample from the announced mask
+	other = Sampler(key, first.sampling_bitvector)
+	assert other.sample() == first.sample()
+	assert len(first.sample()) + len(first.remaining()) == len(key)
+
+def test_sample_size_from_the_confidence_interval():
+	# 1.959964^2 * 0.11 * 0.89 / 0.01^2 = 3760.8
+	assert sample_size(10 ** 6, width=0.01) == 3761
+	# the sample never exceeds the key
+	assert sample_size(100, width=0.01) == 100
+
+def test_sample_size_validation():
+	for fraction in (0, 1, -0.5):
+		with pytest.raises(ValueError):
+			sample_size(100, fraction)
+	with pytest.raises(ValueError):
+		sample_size(100, width=0)